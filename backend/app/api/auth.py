@@ -13,6 +13,7 @@ from app.core.security import (
 )
 from app.schemas.user import UserRead, UserCreate, UserUpdate
 from app.core.config import SECRET_KEY
+from app.core.cache import invalidate_user
 from app.db.session import get_async_session
 from pydantic import BaseModel
 import json
@@ -92,7 +93,7 @@ async def login_with_refresh(
             detail="Failed to issue access token",
         )
 
-    refresh_token = create_refresh_token(user.id)
+    refresh_token = create_refresh_token(user.id, user.token_version)
     return TokenResponse(access_token=access_token, refresh_token=refresh_token)
 
 @router.post("/google/callback", response_model=TokenResponse, tags=["auth"])
@@ -148,6 +149,7 @@ async def google_oauth_callback(
                 session.add(existing_user)
                 await session.commit()
                 await session.refresh(existing_user)
+                invalidate_user(existing_user.id)
             user = existing_user
         else:
             # Create new user from Google info
@@ -166,7 +168,7 @@ async def google_oauth_callback(
         # Generate JWT token
         strategy = get_jwt_strategy()
         access_token = await strategy.write_token(user)
-        refresh_token = create_refresh_token(user.id)
+        refresh_token = create_refresh_token(user.id, user.token_version)
         
         return TokenResponse(
             access_token=access_token,
@@ -188,7 +190,7 @@ async def refresh_access_token(
     user_manager = Depends(get_user_manager),
 ):
     try:
-        user_id = decode_refresh_token(payload.refresh_token)
+        user_id, token_version = decode_refresh_token(payload.refresh_token)
         user_uuid = uuid.UUID(user_id)
     except Exception:
         raise HTTPException(
@@ -197,7 +199,7 @@ async def refresh_access_token(
         )
 
     user = await user_manager.user_db.get(user_uuid)
-    if not user or not user.is_active:
+    if not user or not user.is_active or user.token_version != token_version:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid refresh token",
@@ -205,7 +207,7 @@ async def refresh_access_token(
 
     strategy = get_jwt_strategy()
     access_token = await strategy.write_token(user)
-    refresh_token = create_refresh_token(user.id)
+    refresh_token = create_refresh_token(user.id, user.token_version)
 
     return TokenResponse(access_token=access_token, refresh_token=refresh_token)
 
@@ -1,35 +1,252 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
-from sqlalchemy import select, func
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, UploadFile, File, Form, Query, Request, Response
+from sqlalchemy import select, func, table, column, literal_column
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.book import Book
 from app.models.review import Review
-from app.schemas.book import BookRead
+from app.schemas.book import BookRead, BookSearchResult, BookImportSummary, BookBatchRequest, BookBatchResult
 from app.schemas.user import UserRead
 from app.db.session import get_async_session
+from app.core.cache import MISSING, book_cache, book_list_cache, invalidate_books, invalidate_deleted_book
+from app.db.search import build_match_query
 from app.utils.adminCheck import is_admin
-from typing import List
-import uuid
-import os
-import shutil
-from pathlib import Path
+from app.utils.pagination import encode_cursor, decode_cursor, keyset_after
+from app.utils.uploads import save_upload, save_uploads
+from app.utils.images import refresh_book_image_variants
+from app.utils.image_refs import acquire_images, delete_released_files, release_images
+from app.utils.catalog_import import DEFAULT_BATCH_SIZE, detect_format, import_catalog
+from app.utils.conditional import make_etag, is_not_modified, set_validators, not_modified
+from typing import List, Literal, Optional
+from collections import Counter
 
 router = APIRouter()
 
+books_fts = table("books_fts", column("rowid"))
+
+# Most ids one batch lookup may ask for
+MAX_BATCH_IDS = 300
+
+def _sort_column(sort: str):
+    """Column the catalog is ordered by; id breaks ties"""
+    if sort == "price":
+        return Book.price
+    if sort == "title":
+        return Book.title
+    if sort == "rating":
+        return Book.rating_avg
+    return Book.id
+
+async def _load_book_page(
+    session: AsyncSession,
+    limit: int,
+    cursor: Optional[str],
+    sort: str,
+    order: str,
+    min_price: Optional[float],
+    max_price: Optional[float],
+    in_stock: bool,
+    min_rating: Optional[float],
+    q: Optional[str],
+) -> tuple[list[BookRead], Optional[str], str]:
+    """Run the keyset query for one catalog page; returns (books, next_cursor, etag)"""
+    descending = order == "desc"
+    sort_column = _sort_column(sort)
+    keys = [sort_column] if sort == "id" else [sort_column, Book.id]
+
+    query = select(Book)
+    if min_price is not None:
+        query = query.where(Book.price >= min_price)
+    if max_price is not None:
+        query = query.where(Book.price <= max_price)
+    if in_stock:
+        query = query.where(Book.stock > 0)
+    if min_rating is not None:
+        query = query.where(Book.rating_avg >= min_rating)
+    if q:
+        escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.where(Book.title.ilike(f"{escaped}%", escape="\\"))
+    if cursor:
+        query = query.where(keyset_after(keys, decode_cursor(cursor, keys), descending))
+
+    query = query.order_by(*[key.desc() if descending else key.asc() for key in keys])
+
+    # Fetch one extra row to know whether another page exists
+    result = await session.execute(query.limit(limit + 1))
+    rows = result.scalars().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    books = [BookRead.model_validate(book) for book in rows]
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, key.key) for key in keys])
+
+    etag = make_etag("books", [(book.id, book.version) for book in books], next_cursor)
+    return books, next_cursor, etag
+
 @router.get("", response_model=list[BookRead])
-async def list_books(session: AsyncSession = Depends(get_async_session)):
-    result = await session.execute(select(Book))
-    books = result.scalars().all()
+async def list_books(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    sort: Literal["id", "price", "title", "rating"] = "id",
+    order: Literal["asc", "desc"] = "asc",
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: bool = False,
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    q: Optional[str] = Query(None, min_length=1, description="Title prefix"),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    List books one page at a time using keyset pagination.
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    params = (limit, cursor, sort, order, min_price, max_price, in_stock, min_rating, q)
+    books, next_cursor, etag = await book_list_cache.get_or_load(
+        params, lambda: _load_book_page(session, *params)
+    )
+    # No Last-Modified here: a book dropping out of the page does not move
+    # the newest updated_at, so only the ETag describes the page reliably
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    set_validators(response, etag)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return books
 
-@router.get("/{book_id}", response_model=BookRead)
-async def get_book(book_id: int, session: AsyncSession = Depends(get_async_session)):
-    query = select(Book).where(Book.id == book_id)
+@router.get("/search", response_model=list[BookSearchResult])
+async def search_books(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Full-text search over title and description, best matches first"""
+    match = build_match_query(q)
+    if not match:
+        return []
+
+    fts = literal_column("books_fts")
+    # Title matches weigh more than description matches
+    score = func.bm25(fts, 10.0, 1.0).label("score")
+    title_snippet = func.snippet(fts, 0, "<mark>", "</mark>", "…", 12).label("title_snippet")
+    description_snippet = func.snippet(fts, 1, "<mark>", "</mark>", "…", 24).label("description_snippet")
+
+    query = (
+        select(Book, score, title_snippet, description_snippet)
+        .select_from(books_fts)
+        .join(Book, Book.id == books_fts.c.rowid)
+        .where(fts.op("MATCH")(match))
+        .order_by(score, Book.id)
+        .limit(limit)
+        .offset(offset)
+    )
     result = await session.execute(query)
-    book = result.scalar_one_or_none()
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    return book
+
+    # bm25() is lower-is-better; flip it so clients see higher-is-better
+    return [
+        BookSearchResult(
+            **BookRead.model_validate(book).model_dump(),
+            score=-row_score,
+            title_snippet=row_title,
+            description_snippet=row_description,
+        )
+        for book, row_score, row_title, row_description in result.all()
+    ]
+
+def _parse_batch_ids(raw_ids: List[str]) -> list[int]:
+    """Accept ?ids=1,2,3 as well as repeated ?ids=1&ids=2"""
+    try:
+        return [int(part) for raw in raw_ids for part in raw.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be integers")
+
+async def _load_book_batch(session: AsyncSession, ids: list[int]) -> BookBatchResult:
+    """
+    Resolve several books with one IN query, serving what the per-book
+    cache already holds. Books come back in request order, duplicates
+    dropped; ids without a book are listed in `missing`.
+    """
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="At least one id is required")
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
+
+    found = {}
+    for book_id in ids:
+        book_read = book_cache.get(book_id)
+        if book_read is not MISSING:
+            found[book_id] = book_read
+
+    uncached = [book_id for book_id in ids if book_id not in found]
+    if uncached:
+        generation = book_cache.generation
+        result = await session.execute(select(Book).where(Book.id.in_(uncached)))
+        for book in result.scalars():
+            book_read = BookRead.model_validate(book)
+            book_cache.set(book.id, book_read, generation)
+            found[book.id] = book_read
+
+    return BookBatchResult(
+        books=[found[book_id] for book_id in ids if book_id in found],
+        missing=[book_id for book_id in ids if book_id not in found],
+    )
+
+@router.get("/batch", response_model=BookBatchResult)
+async def get_books_batch(
+    request: Request,
+    response: Response,
+    ids: List[str] = Query(..., description="Comma-separated or repeated book ids"),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Fetch several books in one round trip"""
+    batch = await _load_book_batch(session, _parse_batch_ids(ids))
+
+    etag = make_etag("books-batch", [(book.id, book.version) for book in batch.books], batch.missing)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    set_validators(response, etag)
+    return batch
+
+@router.post("/batch", response_model=BookBatchResult)
+async def post_books_batch(
+    batch_request: BookBatchRequest,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Same as GET /books/batch, for id lists too long for a URL"""
+    return await _load_book_batch(session, batch_request.ids)
+
+@router.get("/{book_id}", response_model=BookRead)
+async def get_book(
+    book_id: int,
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+):
+    book_read = book_cache.get(book_id)
+    if book_read is MISSING:
+        generation = book_cache.generation
+        query = select(Book).where(Book.id == book_id)
+        result = await session.execute(query)
+        book = result.scalar_one_or_none()
+        if not book:
+            raise HTTPException(status_code=404, detail="Book not found")
+
+        book_read = BookRead.model_validate(book)
+        book_cache.set(book_id, book_read, generation)
+
+    etag = make_etag("book", book_read.id, book_read.version)
+    if is_not_modified(request, etag, book_read.updated_at):
+        return not_modified(etag, book_read.updated_at)
+
+    set_validators(response, etag, book_read.updated_at)
+    return book_read
 
 @router.post("/upload-image")
 async def upload_image(
@@ -37,23 +254,12 @@ async def upload_image(
     _: UserRead = Depends(is_admin)
 ):
     """Upload book cover image"""
-    # Create uploads directory if it doesn't exist
-    upload_dir = Path("uploads/books")
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Generate unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = upload_dir / unique_filename
-    
-    # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    return {"image_path": f"/uploads/books/{unique_filename}"}
+    image_path = await save_upload(file)
+    return {"image_path": image_path}
 
 @router.post("", response_model=BookRead)
 async def create_book(
+    background_tasks: BackgroundTasks,
     title: str = Form(...),
     description: str = Form(...),
     stock: int = Form(...),
@@ -69,21 +275,8 @@ async def create_book(
             detail="You must upload between 1 and 4 images"
         )
     
-    image_paths = []
-    upload_dir = Path("uploads/books")
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    
-    for image in images:
-        # Generate unique filename
-        file_extension = os.path.splitext(image.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = upload_dir / unique_filename
-        
-        # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
-        
-        image_paths.append(f"/uploads/books/{unique_filename}")
+    # Images are written concurrently; if one fails the rest are left for gc_uploads
+    image_paths = await save_uploads(images)
     
     new_book = Book(
         title=title,
@@ -93,14 +286,35 @@ async def create_book(
         images=image_paths
     )
     session.add(new_book)
+    await acquire_images(session, image_paths)
+    # Files left behind by a failed commit are unreferenced and get swept
+    # by app.jobs.gc_uploads; they may be shared, so never unlink here
     await session.commit()
     await session.refresh(new_book)
+    invalidate_books(new_book.id)
+    # Thumbnails and WebP variants are produced after the response is sent
+    background_tasks.add_task(refresh_book_image_variants, new_book.id, image_paths)
     
     return new_book
 
+@router.post("/import", response_model=BookImportSummary)
+async def import_books(
+    file: UploadFile = File(...),
+    format: Optional[Literal["csv", "jsonl"]] = Form(None),
+    batch_size: int = Form(DEFAULT_BATCH_SIZE, ge=1, le=10000),
+    _: UserRead = Depends(is_admin)
+):
+    """
+    Bulk import a CSV or JSONL catalog. Rows are upserted by sku in
+    batched transactions; invalid rows are reported, not fatal.
+    """
+    fmt = format or detect_format(file.filename)
+    return await import_catalog(file.file, fmt, batch_size)
+
 @router.put("/{book_id}", response_model=BookRead)
 async def update_book(
     book_id: int,
+    background_tasks: BackgroundTasks,
     title: str = Form(...),
     description: str = Form(...),
     stock: int = Form(...),
@@ -132,44 +346,34 @@ async def update_book(
             detail="Book must have between 1 and 4 images total"
         )
     
-    # Identify images to delete from disk
-    current_images = existing_book.images or []
-    images_to_delete = [img for img in current_images if img not in keep_images_list]
-    
-    for old_image_path in images_to_delete:
-        old_file_path = Path(f".{old_image_path}")
-        if old_file_path.exists():
-            old_file_path.unlink()
+    # Save new images first so a failed upload leaves the book untouched
+    saved_image_paths = await save_uploads(new_images) if new_images else []
+    updated_image_paths = keep_images_list + saved_image_paths
     
-    # Start with kept images
-    updated_image_paths = keep_images_list
-    
-    # Save new images if provided
-    if new_images:
-        upload_dir = Path("uploads/books")
-        upload_dir.mkdir(parents=True, exist_ok=True)
-        
-        for image in new_images:
-            # Generate unique filename
-            file_extension = os.path.splitext(image.filename)[1]
-            unique_filename = f"{uuid.uuid4()}{file_extension}"
-            file_path = upload_dir / unique_filename
-            
-            # Save file
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(image.file, buffer)
-            
-            updated_image_paths.append(f"/uploads/books/{unique_filename}")
+    # Move references from dropped images to added ones
+    current_images = Counter(existing_book.images or [])
+    updated_images = Counter(updated_image_paths)
+    await acquire_images(session, (updated_images - current_images).elements())
+    unreferenced = await release_images(session, (current_images - updated_images).elements())
     
     existing_book.title = title
     existing_book.description = description
     existing_book.stock = stock
     existing_book.price = price
     existing_book.images = updated_image_paths
+    existing_book.image_variants = [
+        entry for entry in existing_book.image_variants or [] if entry["src"] in updated_image_paths
+    ]
     
     session.add(existing_book)
     await session.commit()
     await session.refresh(existing_book)
+    invalidate_books(book_id)
+    if saved_image_paths:
+        background_tasks.add_task(refresh_book_image_variants, book_id, saved_image_paths)
+    
+    # Only drop files no book uses any more, once that is committed
+    await delete_released_files(unreferenced)
     
     return existing_book
 
@@ -184,13 +388,12 @@ async def delete_book(
     if not existing_book:
         raise HTTPException(status_code=404, detail="Book not found")
     
-    # Delete image files if they exist
-    if existing_book.images:
-        for image_path in existing_book.images:
-            image_file_path = Path(f".{image_path}")
-            if image_file_path.exists():
-                image_file_path.unlink()
+    unreferenced = await release_images(session, existing_book.images or [])
     
     await session.delete(existing_book)
     await session.commit()
+    invalidate_deleted_book(book_id)
+    
+    # Delete image files no other book uses, once the row is gone
+    await delete_released_files(unreferenced)
     return {"detail": "Book deleted successfully"}
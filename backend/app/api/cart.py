@@ -1,19 +1,89 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-from sqlalchemy.orm import selectinload
-from typing import List
+from sqlalchemy import select, update, delete, literal, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import joinedload
+from typing import List, Optional
+import uuid
 
 from app.db.session import get_async_session
 from app.models.user import User
 from app.models.cart import Cart
 from app.models.cart_items import CartItem
 from app.models.book import Book
-from app.schemas.cart import CartRead, CartItemCreate, CartItemUpdate
+from app.schemas.cart import CartRead, CartItemCreate, CartItemUpdate, CartBatchRequest, CartBatchResult, CartBatchFailure, CartSummary
 from app.core.security import current_active_user
+from app.core.config import TAX_RATE
+from app.utils.conditional import make_etag, is_not_modified, set_validators, not_modified
 
 router = APIRouter()
 
+async def _load_cart(session: AsyncSession, *criteria) -> Optional[Cart]:
+    """Cart with its items and their books in one joined query"""
+    query = select(Cart).where(*criteria).options(
+        joinedload(Cart.items).joinedload(CartItem.book)
+    )
+    result = await session.execute(query)
+    return result.unique().scalar_one_or_none()
+
+async def _get_or_create_cart(session: AsyncSession, user_id: uuid.UUID):
+    """
+    Insert the user's cart or return the existing one in a single
+    statement; the unique user_id makes concurrent calls converge.
+    """
+    stmt = insert(Cart).values(user_id=user_id)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Cart.user_id],
+        set_={"user_id": stmt.excluded.user_id},
+    ).returning(Cart.id, Cart.created_at)
+    result = await session.execute(stmt)
+    return result.one()
+
+async def _upsert_cart_item(session: AsyncSession, user_id: uuid.UUID, book_id: int, quantity: int) -> Optional[int]:
+    """
+    Add `quantity` of a book to the user's cart with one INSERT ... SELECT
+    ... ON CONFLICT, so concurrent adds accumulate instead of racing.
+    Returns the cart id, or None when the cart or the book does not exist.
+    """
+    source = (
+        select(Cart.id, Book.id, literal(quantity))
+        .select_from(Cart)
+        .join(Book, Book.id == book_id)
+        .where(Cart.user_id == user_id)
+    )
+    stmt = insert(CartItem).from_select(["cart_id", "book_id", "quantity"], source)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CartItem.cart_id, CartItem.book_id],
+        set_={"quantity": CartItem.quantity + stmt.excluded.quantity},
+    ).returning(CartItem.cart_id)
+    result = await session.execute(stmt)
+    return result.scalar_one_or_none()
+
+def _fold_operations(operations) -> tuple[dict[int, int], dict[int, int]]:
+    """
+    Collapse a list of cart operations into per-book changes: quantities
+    to add to whatever is stored (`deltas`) and quantities to store
+    outright (`targets`, where 0 means remove).
+    """
+    deltas, targets = {}, {}
+    for operation in operations:
+        book_id = operation.book_id
+        if operation.op == "add":
+            if book_id in targets:
+                targets[book_id] += operation.quantity
+            else:
+                deltas[book_id] = deltas.get(book_id, 0) + operation.quantity
+        else:
+            deltas.pop(book_id, None)
+            targets[book_id] = max(operation.quantity, 0) if operation.op == "set" else 0
+    return deltas, targets
+
+def _owned_item(item_id: int, user_id: uuid.UUID):
+    return (
+        CartItem.id == item_id,
+        CartItem.cart_id.in_(select(Cart.id).where(Cart.user_id == user_id)),
+    )
+
 @router.get("/", response_model=CartRead)
 async def get_cart(
     user: User = Depends(current_active_user),
@@ -22,22 +92,61 @@ async def get_cart(
     """
     Get the current user's cart. Creates one if it doesn't exist.
     """
-    query = select(Cart).where(Cart.user_id == user.id).options(
-        selectinload(Cart.items).selectinload(CartItem.book)
+    cart = await _load_cart(session, Cart.user_id == user.id)
+    if cart:
+        return cart
+
+    cart_id, created_at = await _get_or_create_cart(session, user.id)
+    await session.commit()
+    return CartRead(id=cart_id, user_id=user.id, created_at=created_at, items=[])
+
+@router.get("/summary", response_model=CartSummary)
+async def get_cart_summary(
+    request: Request,
+    response: Response,
+    user: User = Depends(current_active_user),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Item count and totals for the cart badge, aggregated in one query
+    without loading items or books. Does not create a cart.
+    """
+    query = (
+        select(
+            Cart.id,
+            func.count(CartItem.id),
+            func.coalesce(func.sum(CartItem.quantity), 0),
+            func.coalesce(func.sum(CartItem.quantity * Book.price), 0.0),
+        )
+        .select_from(Cart)
+        .outerjoin(CartItem, CartItem.cart_id == Cart.id)
+        .outerjoin(Book, Book.id == CartItem.book_id)
+        .where(Cart.user_id == user.id)
+        .group_by(Cart.id)
     )
     result = await session.execute(query)
-    cart = result.scalar_one_or_none()
-
-    if not cart:
-        cart = Cart(user_id=user.id)
-        session.add(cart)
-        await session.commit()
-        await session.refresh(cart)
-        # Re-query to load relationships
-        result = await session.execute(query)
-        cart = result.scalar_one()
-    
-    return cart
+    row = result.one_or_none()
+
+    summary = CartSummary()
+    if row:
+        cart_id, distinct_items, item_count, subtotal = row
+        subtotal = round(subtotal, 2)
+        tax = round(subtotal * TAX_RATE, 2)
+        summary = CartSummary(
+            cart_id=cart_id,
+            item_count=item_count,
+            distinct_items=distinct_items,
+            subtotal=subtotal,
+            tax=tax,
+            total=round(subtotal + tax, 2),
+        )
+
+    etag = make_etag("cart-summary", *summary.model_dump().values())
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    set_validators(response, etag)
+    return summary
 
 @router.post("/items", response_model=CartRead)
 async def add_item_to_cart(
@@ -48,50 +157,17 @@ async def add_item_to_cart(
     """
     Add a book to the cart. If the book is already in the cart, updates the quantity.
     """
-    # 1. Get or create cart
-    query = select(Cart).where(Cart.user_id == user.id).options(selectinload(Cart.items))
-    result = await session.execute(query)
-    cart = result.scalar_one_or_none()
-
-    if not cart:
-        cart = Cart(user_id=user.id)
-        session.add(cart)
-        await session.commit()
-        await session.refresh(cart)
-
-    # 2. Check if book exists
-    book_query = select(Book).where(Book.id == item_in.book_id)
-    book_result = await session.execute(book_query)
-    book = book_result.scalar_one_or_none()
-    if not book:
+    cart_id = await _upsert_cart_item(session, user.id, item_in.book_id, item_in.quantity)
+    if cart_id is None:
+        # First item for this user: create the cart and try once more
+        await _get_or_create_cart(session, user.id)
+        cart_id = await _upsert_cart_item(session, user.id, item_in.book_id, item_in.quantity)
+    if cart_id is None:
+        await session.rollback()
         raise HTTPException(status_code=404, detail="Book not found")
 
-    # 3. Check if item already exists in cart
-    item_query = select(CartItem).where(
-        and_(CartItem.cart_id == cart.id, CartItem.book_id == item_in.book_id)
-    )
-    item_result = await session.execute(item_query)
-    existing_item = item_result.scalar_one_or_none()
-
-    if existing_item:
-        existing_item.quantity += item_in.quantity
-        session.add(existing_item)
-    else:
-        new_item = CartItem(
-            cart_id=cart.id,
-            book_id=item_in.book_id,
-            quantity=item_in.quantity
-        )
-        session.add(new_item)
-    
     await session.commit()
-    
-    # Return updated cart
-    query = select(Cart).where(Cart.user_id == user.id).options(
-        selectinload(Cart.items).selectinload(CartItem.book)
-    )
-    result = await session.execute(query)
-    return result.scalar_one()
+    return await _load_cart(session, Cart.id == cart_id)
 
 @router.put("/items/{item_id}", response_model=CartRead)
 async def update_cart_item(
@@ -103,30 +179,19 @@ async def update_cart_item(
     """
     Update the quantity of a cart item.
     """
-    # Verify item belongs to user's cart
-    query = select(CartItem).join(Cart).where(
-        and_(CartItem.id == item_id, Cart.user_id == user.id)
-    )
-    result = await session.execute(query)
-    item = result.scalar_one_or_none()
+    # Ownership is part of the WHERE clause, so this is a single statement
+    if item_in.quantity <= 0:
+        stmt = delete(CartItem).where(*_owned_item(item_id, user.id))
+    else:
+        stmt = update(CartItem).where(*_owned_item(item_id, user.id)).values(quantity=item_in.quantity)
+    result = await session.execute(stmt.returning(CartItem.cart_id))
+    cart_id = result.scalar_one_or_none()
 
-    if not item:
+    if cart_id is None:
         raise HTTPException(status_code=404, detail="Cart item not found")
 
-    if item_in.quantity <= 0:
-        await session.delete(item)
-    else:
-        item.quantity = item_in.quantity
-        session.add(item)
-    
     await session.commit()
-
-    # Return updated cart
-    cart_query = select(Cart).where(Cart.user_id == user.id).options(
-        selectinload(Cart.items).selectinload(CartItem.book)
-    )
-    cart_result = await session.execute(cart_query)
-    return cart_result.scalar_one()
+    return await _load_cart(session, Cart.id == cart_id)
 
 @router.delete("/items/{item_id}", response_model=CartRead)
 async def remove_cart_item(
@@ -137,21 +202,77 @@ async def remove_cart_item(
     """
     Remove an item from the cart.
     """
-    query = select(CartItem).join(Cart).where(
-        and_(CartItem.id == item_id, Cart.user_id == user.id)
+    result = await session.execute(
+        delete(CartItem).where(*_owned_item(item_id, user.id)).returning(CartItem.cart_id)
     )
-    result = await session.execute(query)
-    item = result.scalar_one_or_none()
+    cart_id = result.scalar_one_or_none()
 
-    if not item:
+    if cart_id is None:
         raise HTTPException(status_code=404, detail="Cart item not found")
 
-    await session.delete(item)
     await session.commit()
+    return await _load_cart(session, Cart.id == cart_id)
 
-    # Return updated cart
-    cart_query = select(Cart).where(Cart.user_id == user.id).options(
-        selectinload(Cart.items).selectinload(CartItem.book)
+@router.post("/batch", response_model=CartBatchResult)
+async def apply_cart_batch(
+    batch: CartBatchRequest,
+    user: User = Depends(current_active_user),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Apply several add / set / remove operations (keyed by book) in one
+    transaction, e.g. to merge a guest cart at login, and return the cart
+    once. Referenced books are checked with a single query.
+    """
+    book_ids = {operation.book_id for operation in batch.operations}
+    result = await session.execute(select(Book.id).where(Book.id.in_(book_ids)))
+    known = set(result.scalars())
+
+    failed = []
+    for index, operation in enumerate(batch.operations):
+        if operation.book_id not in known:
+            failed.append(CartBatchFailure(index=index, book_id=operation.book_id, detail="Book not found"))
+        elif operation.op == "add" and operation.quantity < 1:
+            failed.append(CartBatchFailure(index=index, book_id=operation.book_id, detail="Quantity must be at least 1"))
+    if failed and batch.atomic:
+        raise HTTPException(
+            status_code=400,
+            detail=[failure.model_dump() for failure in failed],
+        )
+
+    failed_indexes = {failure.index for failure in failed}
+    deltas, targets = _fold_operations(
+        operation for index, operation in enumerate(batch.operations) if index not in failed_indexes
     )
-    cart_result = await session.execute(cart_query)
-    return cart_result.scalar_one()
+
+    cart_id, _ = await _get_or_create_cart(session, user.id)
+    if deltas:
+        stmt = insert(CartItem)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.book_id],
+            set_={"quantity": CartItem.quantity + stmt.excluded.quantity},
+        )
+        await session.execute(stmt, [
+            {"cart_id": cart_id, "book_id": book_id, "quantity": quantity}
+            for book_id, quantity in deltas.items()
+        ])
+    stored = {book_id: quantity for book_id, quantity in targets.items() if quantity > 0}
+    if stored:
+        stmt = insert(CartItem)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.book_id],
+            set_={"quantity": stmt.excluded.quantity},
+        )
+        await session.execute(stmt, [
+            {"cart_id": cart_id, "book_id": book_id, "quantity": quantity}
+            for book_id, quantity in stored.items()
+        ])
+    removed = [book_id for book_id, quantity in targets.items() if quantity <= 0]
+    if removed:
+        await session.execute(
+            delete(CartItem).where(CartItem.cart_id == cart_id, CartItem.book_id.in_(removed))
+        )
+
+    await session.commit()
+    cart = await _load_cart(session, Cart.id == cart_id)
+    return CartBatchResult(cart=CartRead.model_validate(cart), failed=failed)
@@ -0,0 +1,58 @@
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.models.book import Book
+from app.models.orders import Order
+from app.schemas.book import BookRead
+from app.schemas.order import OrderRead
+from app.schemas.user import UserRead
+from app.utils.adminCheck import is_admin
+from app.utils.export import MEDIA_TYPES, changed_since, export_headers, stream_export
+
+router = APIRouter()
+
+def _export_response(query, schema, name: str, fmt: str, gzip: bool) -> StreamingResponse:
+    return StreamingResponse(
+        stream_export(query, schema, fmt, gzip),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[fmt],
+        headers=export_headers(name, fmt, gzip),
+    )
+
+@router.get("/books")
+async def export_books(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    updated_since: Optional[datetime] = None,
+    after_id: Optional[int] = Query(None, ge=0),
+    gzip: bool = False,
+    _: UserRead = Depends(is_admin),
+):
+    """
+    Stream the catalog in id order. `updated_since` and `after_id` limit
+    the export to rows changed since a previous run.
+    """
+    query = select(Book).order_by(Book.id)
+    if updated_since is not None:
+        query = query.where(changed_since(Book.updated_at, updated_since))
+    if after_id is not None:
+        query = query.where(Book.id > after_id)
+    return _export_response(query, BookRead, "books", format, gzip)
+
+@router.get("/orders")
+async def export_orders(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    updated_since: Optional[datetime] = None,
+    after_id: Optional[int] = Query(None, ge=0),
+    gzip: bool = False,
+    _: UserRead = Depends(is_admin),
+):
+    """Stream all orders in id order, optionally only recent changes"""
+    query = select(Order).order_by(Order.id)
+    if updated_since is not None:
+        query = query.where(changed_since(Order.updated_at, updated_since))
+    if after_id is not None:
+        query = query.where(Order.id > after_id)
+    return _export_response(query, OrderRead, "orders", format, gzip)
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends
+
+from app.core.cache import cache_stats
+from app.schemas.user import UserRead
+from app.utils.adminCheck import is_admin
+from app.utils.order_events import order_events
+from app.utils.webhook_inbox import webhook_inbox
+
+router = APIRouter()
+
+@router.get("/cache")
+async def get_cache_stats(_: UserRead = Depends(is_admin)):
+    """Hit/miss/eviction counters for the in-process read caches"""
+    return {"caches": cache_stats()}
+
+@router.get("/webhooks")
+async def get_webhook_stats(_: UserRead = Depends(is_admin)):
+    """Webhook inbox queue depth, failures and processing lag"""
+    return await webhook_inbox.stats()
+
+@router.get("/order-events")
+async def get_order_event_stats(_: UserRead = Depends(is_admin)):
+    """Open order status streams and published/dropped event counts"""
+    return order_events.stats()
@@ -1,65 +1,210 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+import asyncio
+import json
+import logging
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import String, select, delete, insert, update, func, literal, type_coerce
+from sqlalchemy.orm import joinedload, selectinload
 from typing import Optional
 
-from app.db.session import get_async_session
+from app.db.session import get_async_session, async_session_maker
 from app.models.user import User
 from app.models.cart import Cart
 from app.models.cart_items import CartItem
 from app.models.orders import Order
+from app.models.order_items import OrderItem
 from app.models.book import Book
+from app.models.review import Review
 from app.schemas.order import (
     OrderRead,
+    OrderDetail,
     OrderCreate,
     CheckoutSessionRequest,
     CheckoutSessionResponse,
     PaymentIntentResponse,
 )
 from app.core.security import current_active_user
-from app.core.config import STRIPE_SECRET_KEY, STRIPE_PUBLISHABLE_KEY
-from app.core.stripe import stripe
+from app.core.config import (
+    STRIPE_SECRET_KEY,
+    STRIPE_PUBLISHABLE_KEY,
+    TAX_RATE,
+    ORDER_EVENTS_HEARTBEAT_SECONDS,
+    ORDER_EVENTS_STREAM_SECONDS,
+)
+from app.core.stripe import stripe, get_stripe_gateway, StripeUnavailable
+from app.core.cache import invalidate_books, invalidate_deleted_book
+from app.utils.image_refs import delete_released_files, release_images
+from app.utils.reservations import reserve_stock, release_order_reservations
+from app.utils.keyed_lock import KeyedLock
+from app.utils.idempotency import idempotent_request
+from app.utils.pagination import encode_cursor, decode_cursor, keyset_after
+from app.utils.webhook_inbox import store_event, webhook_inbox
+from app.utils.order_events import order_events
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Serializes payment processing per order id within this process
+order_locks = KeyedLock()
+
+def _ordered_quantity(order_id: int):
+    """Correlated subquery: how many copies of the outer `books` row the order holds"""
+    return (
+        select(func.sum(OrderItem.quantity))
+        .where((OrderItem.order_id == order_id) & (OrderItem.book_id == Book.id))
+        .scalar_subquery()
+    )
+
+async def snapshot_order_lines(session: AsyncSession, order: Order, cart: Cart):
+    """
+    Record the cart's lines on `order` as they are at checkout, replacing
+    those of an earlier attempt. Completing the order reads them back, so
+    later cart changes do not alter what was paid for.
+    """
+    await session.execute(
+        delete(OrderItem)
+        .where(OrderItem.order_id == order.id)
+        .execution_options(synchronize_session=False)
+    )
+    await session.execute(
+        insert(OrderItem),
+        [
+            {
+                "order_id": order.id,
+                "book_id": item.book_id,
+                "title": item.book.title,
+                "unit_price": item.book.price,
+                "quantity": item.quantity,
+            }
+            for item in cart.items
+        ],
+    )
 
-async def process_successful_payment(order: Order, session: AsyncSession):
-    """Decrease stock and clear cart after payment"""
+async def process_successful_payment(order: Order, session: AsyncSession, clear_cart: bool = True):
+    """
+    Decrease stock by the order's lines and clear the cart after payment,
+    as a handful of set-based statements whatever the size of the order.
+    """
     if order and order.status != "completed":
-        # Get cart with items
-        cart_query = select(Cart).where(
-            Cart.id == order.cart_id
-        ).options(
-            selectinload(Cart.items).selectinload(CartItem.book)
+        # Claim the order first so a duplicate delivery (webhook retry,
+        # verify-session fallback, another worker) finds it taken
+        claimed = await session.execute(
+            update(Order)
+            .where((Order.id == order.id) & (Order.status != "completed"))
+            .values(status="completed")
         )
-        cart_result = await session.execute(cart_query)
-        cart = cart_result.scalar_one_or_none()
-        
-        if cart and cart.items:
-            # Decrease stock for each item
-            for item in cart.items:
-                if item.book:
-                    # Ensure stock doesn't go negative
-                    new_stock = max(0, item.book.stock - item.quantity)
-                    item.book.stock = new_stock
-                    
-                    if new_stock == 0:
-                        # User requested to delete book if stock is 0
-                        await session.delete(item.book)
-                    else:
-                        session.add(item.book)
-            
-            # Delete all items from cart
-            for item in list(cart.items):
-                await session.delete(item)
-        
-        # Update order status
-        order.status = "completed"
-        session.add(order)
+        if claimed.rowcount != 1:
+            await session.rollback()
+            return False
+
+        cart_id = order.cart_id
+        has_lines = await session.scalar(
+            select(OrderItem.id).where(OrderItem.order_id == order.id).limit(1)
+        )
+        if has_lines is None:
+            # Checked out before lines were recorded at checkout: the cart
+            # is all there is to go on
+            await session.execute(
+                insert(OrderItem).from_select(
+                    ["order_id", "book_id", "title", "unit_price", "quantity"],
+                    select(literal(order.id), Book.id, Book.title, Book.price, CartItem.quantity)
+                    .join(Book, Book.id == CartItem.book_id)
+                    .where(CartItem.cart_id == cart_id)
+                    .order_by(CartItem.id),
+                )
+            )
+        quantity = _ordered_quantity(order.id)
+        ordered_books = Book.id.in_(select(OrderItem.book_id).where(OrderItem.order_id == order.id))
+
+        # The paid copies stop being "reserved" and leave stock below
+        changed_book_ids = await release_order_reservations(session, order.id)
+
+        # Every line that stock covers, in one conditional UPDATE
+        result = await session.execute(
+            update(Book)
+            .where(ordered_books & (Book.stock >= quantity))
+            .values(stock=Book.stock - quantity)
+            .returning(Book.id, Book.stock, Book.images)
+            .execution_options(synchronize_session=False)
+        )
+        rows = result.all()
+        # Lines it does not cover: the hold expired and the copies went to
+        # someone else. Already paid, so stock bottoms out at zero
+        covered = [book_id for book_id, _, _ in rows]
+        result = await session.execute(
+            update(Book)
+            .where(ordered_books & Book.id.not_in(covered) & (Book.stock < quantity))
+            .values(stock=0)
+            .returning(Book.id, Book.stock, Book.images)
+            .execution_options(synchronize_session=False)
+        )
+        oversold = result.all()
+        for book_id, _, _ in oversold:
+            logger.warning("Order %s oversold book %s", order.id, book_id)
+        rows += oversold
+        changed_book_ids += [book_id for book_id, _, _ in rows]
+
+        # User requested to delete book if stock is 0
+        sold_out = [(book_id, images) for book_id, stock, images in rows if stock == 0]
+        deleted_book_ids = [book_id for book_id, _ in sold_out]
+        unreferenced_images = await release_images(
+            session, [path for _, images in sold_out for path in images or []]
+        )
+        if deleted_book_ids:
+            # Core deletes skip the ORM cascade to reviews, so do it here
+            await session.execute(
+                delete(Review)
+                .where(Review.book_id.in_(deleted_book_ids))
+                .execution_options(synchronize_session=False)
+            )
+            await session.execute(
+                delete(Book)
+                .where(Book.id.in_(deleted_book_ids))
+                .execution_options(synchronize_session=False)
+            )
+
+        if clear_cart:
+            await session.execute(
+                delete(CartItem)
+                .where(CartItem.cart_id == cart_id)
+                .execution_options(synchronize_session=False)
+            )
+
         await session.commit()
+        invalidate_books(*changed_book_ids)
+        for book_id in deleted_book_ids:
+            invalidate_deleted_book(book_id)
+        await delete_released_files(unreferenced_images)
+        order_events.publish(order.id, {"event": "status", "status": "completed"})
         return True
     return False
 
+async def hold_cart_stock(session: AsyncSession, cart: Cart, order: Order) -> list[int]:
+    """
+    Reserve the cart's books for `order`, replacing any holds that earlier
+    checkout attempts of the same cart still have. Returns the book ids
+    whose reserved count changed.
+    """
+    pending = await session.execute(
+        select(Order.id).where((Order.cart_id == cart.id) & (Order.status == "pending"))
+    )
+    released = await release_order_reservations(session, *pending.scalars())
+    reserved = await reserve_stock(session, order.id, [(item.book_id, item.quantity) for item in cart.items])
+    return sorted(set(released) | set(reserved))
+
+async def abandon_checkout(session: AsyncSession, order: Order, delete_order: bool):
+    """Undo hold_cart_stock after the payment provider call failed"""
+    order_id = order.id
+    await session.rollback()
+    released = await release_order_reservations(session, order_id)
+    if delete_order:
+        await session.execute(delete(OrderItem).where(OrderItem.order_id == order_id))
+        await session.execute(delete(Order).where(Order.id == order_id))
+    await session.commit()
+    invalidate_books(*released)
+
 def get_cart_total(cart_items: list) -> tuple[float, list]:
     """Calculate cart total and return (total, items_data)"""
     total = 0.0
@@ -70,22 +215,20 @@ def get_cart_total(cart_items: list) -> tuple[float, list]:
         total += item_total
         items_data.append({
             "name": item.book.title,
-            "price": item.book.price + item.book.price * 0.1,  # Add 10% tax
+            "price": item.book.price + item.book.price * TAX_RATE,  # Add tax
             "quantity": item.quantity,
             "book_id": item.book.id,
         })
     
     return total, items_data
 
-@router.post("/checkout/session", response_model=CheckoutSessionResponse, tags=["payments"])
-async def create_checkout_session(
+async def start_checkout_session(
     request: CheckoutSessionRequest,
-    user: User = Depends(current_active_user),
-    session: AsyncSession = Depends(get_async_session),
-):
-    """
-    Create a Stripe checkout session for the user's cart.
-    """
+    user: User,
+    session: AsyncSession,
+    stripe_idempotency_key: Optional[str] = None,
+) -> CheckoutSessionResponse:
+    """Create a pending order holding the cart's stock, then its Stripe checkout session"""
     # Get cart with items
     cart_query = select(Cart).where(
         (Cart.user_id == user.id) & (Cart.id == request.cart_id)
@@ -103,9 +246,21 @@ async def create_checkout_session(
     
     # Calculate total and prepare line items
     total_amount, items_data = get_cart_total(cart.items)
-    
-    # Convert to cents for Stripe
-    total_cents = int(total_amount * 100)
+
+    # Hold the stock first; committing before the Stripe call keeps the
+    # database write lock out of the network round trip
+    order = Order(
+        user_id=user.id,
+        cart_id=request.cart_id,
+        total_amount=total_amount,
+        status="pending",
+    )
+    session.add(order)
+    await session.flush()
+    await snapshot_order_lines(session, order, cart)
+    held_book_ids = await hold_cart_stock(session, cart, order)
+    await session.commit()
+    invalidate_books(*held_book_ids)
     
     # Prepare line items for Stripe
     line_items = [
@@ -124,7 +279,8 @@ async def create_checkout_session(
     
     try:
         # Create Stripe checkout session
-        checkout_session = stripe.checkout.Session.create(
+        checkout_session = await get_stripe_gateway().create_checkout_session(
+            idempotency_key=stripe_idempotency_key,
             payment_method_types=["card"],
             line_items=line_items,
             mode="payment",
@@ -138,38 +294,32 @@ async def create_checkout_session(
             }
         )
         
-        # Create order in database with pending status
-        order = Order(
-            user_id=user.id,
-            cart_id=request.cart_id,
-            total_amount=total_amount,
-            status="pending",
-            stripe_session_id=checkout_session.id,
-        )
-        session.add(order)
+        # Link the pending order to the Stripe session
+        order.stripe_session_id = checkout_session.id
         await session.commit()
-        await session.refresh(order)
         
         return CheckoutSessionResponse(
             session_id=checkout_session.id,
             publishable_key=STRIPE_PUBLISHABLE_KEY,
         )
     
+    except StripeUnavailable as e:
+        await abandon_checkout(session, order, delete_order=True)
+        raise HTTPException(status_code=503, detail=str(e))
     except stripe.error.StripeError as e:
+        await abandon_checkout(session, order, delete_order=True)
         raise HTTPException(status_code=400, detail=f"Stripe error: {str(e)}")
     except Exception as e:
+        await abandon_checkout(session, order, delete_order=True)
         raise HTTPException(status_code=500, detail=f"Payment error: {str(e)}")
 
-@router.post("/payment-intent", response_model=PaymentIntentResponse, tags=["payments"])
-async def create_payment_intent(
+async def start_payment_intent(
     request: CheckoutSessionRequest,
-    user: User = Depends(current_active_user),
-    session: AsyncSession = Depends(get_async_session),
-):
-    """
-    Create a Stripe payment intent for the user's cart.
-    Alternative to checkout session if using custom payment form.
-    """
+    user: User,
+    session: AsyncSession,
+    stripe_idempotency_key: Optional[str] = None,
+) -> PaymentIntentResponse:
+    """Hold the cart's stock under its pending order, then create a Stripe payment intent"""
     # Get cart with items
     cart_query = select(Cart).where(
         (Cart.user_id == user.id) & (Cart.id == request.cart_id)
@@ -188,10 +338,36 @@ async def create_payment_intent(
     # Calculate total
     total_amount, _ = get_cart_total(cart.items)
     total_cents = int(total_amount * 100)
+
+    # Reuse the cart's pending order, if any, and hold its stock before
+    # calling Stripe
+    order_query = select(Order).where(
+        (Order.user_id == user.id) & (Order.cart_id == request.cart_id) & (Order.status == "pending")
+    ).order_by(Order.id.desc()).limit(1)
+    order_result = await session.execute(order_query)
+    order = order_result.scalar_one_or_none()
+    created = order is None
+
+    if created:
+        order = Order(
+            user_id=user.id,
+            cart_id=request.cart_id,
+            total_amount=total_amount,
+            status="pending",
+        )
+        session.add(order)
+    else:
+        order.total_amount = total_amount
+    await session.flush()
+    await snapshot_order_lines(session, order, cart)
+    held_book_ids = await hold_cart_stock(session, cart, order)
+    await session.commit()
+    invalidate_books(*held_book_ids)
     
     try:
         # Create payment intent
-        payment_intent = stripe.PaymentIntent.create(
+        payment_intent = await get_stripe_gateway().create_payment_intent(
+            idempotency_key=stripe_idempotency_key,
             amount=total_cents,
             currency="usd",
             metadata={
@@ -201,26 +377,8 @@ async def create_payment_intent(
             },
         )
         
-        # Create or update order
-        order_query = select(Order).where(
-            (Order.user_id == user.id) & (Order.cart_id == request.cart_id)
-        )
-        order_result = await session.execute(order_query)
-        order = order_result.scalar_one_or_none()
-        
-        if not order:
-            order = Order(
-                user_id=user.id,
-                cart_id=request.cart_id,
-                total_amount=total_amount,
-                status="pending",
-                stripe_payment_intent_id=payment_intent.id,
-            )
-            session.add(order)
-        else:
-            order.stripe_payment_intent_id = payment_intent.id
-            session.add(order)
-        
+        # Link the pending order to the payment intent
+        order.stripe_payment_intent_id = payment_intent.id
         await session.commit()
         
         return PaymentIntentResponse(
@@ -228,11 +386,58 @@ async def create_payment_intent(
             publishable_key=STRIPE_PUBLISHABLE_KEY,
         )
     
+    except StripeUnavailable as e:
+        await abandon_checkout(session, order, delete_order=created)
+        raise HTTPException(status_code=503, detail=str(e))
     except stripe.error.StripeError as e:
+        await abandon_checkout(session, order, delete_order=created)
         raise HTTPException(status_code=400, detail=f"Stripe error: {str(e)}")
     except Exception as e:
+        await abandon_checkout(session, order, delete_order=created)
         raise HTTPException(status_code=500, detail=f"Payment error: {str(e)}")
 
+@router.post("/checkout/session", response_model=CheckoutSessionResponse, tags=["payments"])
+async def create_checkout_session(
+    request: CheckoutSessionRequest,
+    response: Response,
+    user: User = Depends(current_active_user),
+    session: AsyncSession = Depends(get_async_session),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+):
+    """
+    Create a Stripe checkout session for the user's cart.
+    A repeated Idempotency-Key replays the first response instead of
+    creating another order and session.
+    """
+    async with idempotent_request(user.id, "checkout-session", idempotency_key, request) as keyed:
+        if keyed.replay is not None:
+            response.headers["Idempotent-Replayed"] = "true"
+            return CheckoutSessionResponse(**keyed.replay)
+        result = await start_checkout_session(request, user, session, keyed.stripe_key)
+        await keyed.save(result)
+        return result
+
+@router.post("/payment-intent", response_model=PaymentIntentResponse, tags=["payments"])
+async def create_payment_intent(
+    request: CheckoutSessionRequest,
+    response: Response,
+    user: User = Depends(current_active_user),
+    session: AsyncSession = Depends(get_async_session),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+):
+    """
+    Create a Stripe payment intent for the user's cart.
+    Alternative to checkout session if using custom payment form.
+    A repeated Idempotency-Key replays the first response.
+    """
+    async with idempotent_request(user.id, "payment-intent", idempotency_key, request) as keyed:
+        if keyed.replay is not None:
+            response.headers["Idempotent-Replayed"] = "true"
+            return PaymentIntentResponse(**keyed.replay)
+        result = await start_payment_intent(request, user, session, keyed.stripe_key)
+        await keyed.save(result)
+        return result
+
 @router.post("/verify-session", tags=["payments"])
 async def verify_session(
     request: dict,
@@ -249,7 +454,7 @@ async def verify_session(
 
     try:
         # Retrieve the session from Stripe
-        checkout_session = stripe.checkout.Session.retrieve(session_id)
+        checkout_session = await get_stripe_gateway().retrieve_checkout_session(session_id)
         
         if checkout_session.payment_status == "paid":
             # Get order by session ID
@@ -260,13 +465,20 @@ async def verify_session(
             order = order_result.scalar_one_or_none()
             
             if order:
-                updated = await process_successful_payment(order, session)
+                async with order_locks(order.id):
+                    # The webhook inbox may have completed it meanwhile
+                    await session.refresh(order)
+                    updated = await process_successful_payment(order, session)
                 return {"status": "success", "updated": updated}
             else:
                 raise HTTPException(status_code=404, detail="Order not found")
         else:
             return {"status": "pending", "payment_status": checkout_session.payment_status}
             
+    except HTTPException:
+        raise
+    except StripeUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except stripe.error.StripeError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -274,45 +486,170 @@ async def verify_session(
 
 @router.get("/orders", response_model=list[OrderRead], tags=["orders"])
 async def get_user_orders(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     user: User = Depends(current_active_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """
-    Get all orders for the current user.
+    Get the current user's orders, newest first, one page at a time.
+    The cursor for the next page is returned in the X-Next-Cursor header.
     """
-    query = select(Order).where(Order.user_id == user.id).order_by(Order.created_at.desc())
-    result = await session.execute(query)
-    orders = result.scalars().all()
-    return orders
+    # created_at is compared as the text SQLite stored: a bound datetime
+    # would be rendered with microseconds and never equal a stored value
+    created_key = type_coerce(Order.created_at, String)
+    keys = [created_key, Order.id]
+    query = select(Order, created_key.label("created_key")).where(Order.user_id == user.id)
+    if cursor:
+        query = query.where(keyset_after(keys, decode_cursor(cursor, keys), descending=True))
+    query = query.order_by(Order.created_at.desc(), Order.id.desc())
 
-@router.get("/orders/{order_id}", response_model=OrderRead, tags=["orders"])
+    # Fetch one extra row to know whether another page exists
+    result = await session.execute(query.limit(limit + 1))
+    rows = result.all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_order, last_created = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor([last_created, last_order.id])
+    return [order for order, _ in rows]
+
+@router.get("/orders/{order_id}", response_model=OrderDetail, tags=["orders"])
 async def get_order(
     order_id: int,
     user: User = Depends(current_active_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """
-    Get a specific order for the current user.
+    Get a specific order for the current user, with its purchased lines
+    (loaded in the same query).
     """
     query = select(Order).where(
         (Order.id == order_id) & (Order.user_id == user.id)
-    )
+    ).options(joinedload(Order.items))
     result = await session.execute(query)
-    order = result.scalar_one_or_none()
+    order = result.unique().scalar_one_or_none()
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
     return order
 
+# Statuses after which an order does not change any more
+FINAL_ORDER_STATUSES = {"completed", "refunded", "expired"}
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _order_status(order_id: int) -> Optional[str]:
+    async with async_session_maker() as session:
+        return await session.scalar(select(Order.status).where(Order.id == order_id))
+
+@router.get("/orders/{order_id}/events", tags=["orders"])
+async def stream_order_events(
+    order_id: int,
+    user: User = Depends(current_active_user),
+):
+    """
+    Server-sent events for one order: its current status right away, then
+    every change until the status is final. Use this instead of polling
+    /verify-session after checkout. Idle streams get a heartbeat comment,
+    which is also when the database is rechecked for changes made by other
+    workers.
+    """
+    # A request-scoped session would hold its connection for as long as
+    # the stream stays open
+    async with async_session_maker() as session:
+        owned = await session.scalar(
+            select(Order.id).where((Order.id == order_id) & (Order.user_id == user.id))
+        )
+    if owned is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    queue = order_events.subscribe(order_id)
+
+    async def stream():
+        try:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + ORDER_EVENTS_STREAM_SECONDS
+            current = await _order_status(order_id)
+            yield f"retry: {int(ORDER_EVENTS_HEARTBEAT_SECONDS * 1000)}\n"
+            yield _sse("status", {"order_id": order_id, "status": current})
+
+            while current is not None and current not in FINAL_ORDER_STATUSES:
+                timeout = min(ORDER_EVENTS_HEARTBEAT_SECONDS, deadline - loop.time())
+                if timeout <= 0:
+                    break
+                try:
+                    event = dict(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    latest = await _order_status(order_id)
+                    if latest == current:
+                        yield ": heartbeat\n\n"
+                    else:
+                        current = latest
+                        yield _sse("status", {"order_id": order_id, "status": current})
+                    continue
+
+                name = event.pop("event")
+                if name == "status":
+                    current = event["status"]
+                yield _sse(name, {"order_id": order_id, **event})
+        finally:
+            order_events.unsubscribe(order_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also covers a client gone before the generator ever started
+        background=BackgroundTask(order_events.unsubscribe, order_id, queue),
+    )
+
+async def _event_order_id(event: dict) -> Optional[int]:
+    """Id of the order a Stripe event is about, if it is one we act on"""
+    event_type = event.get("type")
+    # Signed but malformed events are ignored rather than failing the ack
+    data = (event.get("data") or {}).get("object") or {}
+
+    if event_type == "payment_intent.succeeded" and data.get("id"):
+        criteria = Order.stripe_payment_intent_id == data["id"]
+    elif event_type == "checkout.session.completed" and data.get("id"):
+        criteria = Order.stripe_session_id == data["id"]
+    elif event_type == "charge.refunded" and data.get("payment_intent"):
+        criteria = Order.stripe_payment_intent_id == data["payment_intent"]
+    else:
+        return None
+
+    async with async_session_maker() as session:
+        return await session.scalar(select(Order.id).where(criteria))
+
+async def handle_stripe_event(event: dict):
+    """Apply one Stripe event taken from the webhook inbox"""
+    event_type = event["type"]
+    order_id = await _event_order_id(event)
+    if order_id is None:
+        return
+
+    async with order_locks(order_id):
+        async with async_session_maker() as session:
+            order = await session.get(Order, order_id)
+            if event_type == "charge.refunded":
+                # Update order status if refund happens
+                order.status = "refunded"
+                await session.commit()
+                order_events.publish(order_id, {"event": "status", "status": "refunded"})
+            else:
+                await process_successful_payment(order, session)
+
 @router.post("/webhook", tags=["webhooks"])
 async def stripe_webhook(
     request: Request,
     session: AsyncSession = Depends(get_async_session),
 ):
     """
-    Handle Stripe webhook events.
-    Decreases book stock and clears cart on successful payment.
+    Receive Stripe webhook events.
+    Verified events are stored in the inbox (deduplicated by event id) and
+    acknowledged at once; the inbox workers apply them.
     """
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature")
@@ -326,45 +663,13 @@ async def stripe_webhook(
     except stripe.error.SignatureVerificationError as e:
         raise HTTPException(status_code=400, detail="Invalid signature")
     
-    # Handle different event types
-    if event["type"] == "payment_intent.succeeded":
-        payment_intent = event["data"]["object"]
-        
-        # Get order by payment intent ID
-        order_query = select(Order).where(
-            Order.stripe_payment_intent_id == payment_intent.id
-        )
-        order_result = await session.execute(order_query)
-        order = order_result.scalar_one_or_none()
-        
-        await process_successful_payment(order, session)
-    
-    elif event["type"] == "checkout.session.completed":
-        checkout_session = event["data"]["object"]
-        
-        # Get order by session ID
-        order_query = select(Order).where(
-            Order.stripe_session_id == checkout_session.id
-        )
-        order_result = await session.execute(order_query)
-        order = order_result.scalar_one_or_none()
-        
-        await process_successful_payment(order, session)
-    
-    elif event["type"] == "charge.refunded":
-        charge = event["data"]["object"]
-        
-        # Update order status if refund happens
-        if charge.get("payment_intent"):
-            order_query = select(Order).where(
-                Order.stripe_payment_intent_id == charge["payment_intent"]
-            )
-            order_result = await session.execute(order_query)
-            order = order_result.scalar_one_or_none()
-            
-            if order:
-                order.status = "refunded"
-                session.add(order)
-                await session.commit()
+    event = json.loads(payload)
+    if await store_event(session, event):
+        await session.commit()
+        webhook_inbox.notify()
+        # Lets a waiting client know before the inbox gets to the event
+        order_id = await _event_order_id(event)
+        if order_id is not None:
+            order_events.publish(order_id, {"event": "payment_received", "type": event["type"]})
     
     return {"status": "received"}
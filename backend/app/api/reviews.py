@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
@@ -10,15 +10,35 @@ from app.models.review import Review
 from app.models.book import Book
 from app.schemas.review import ReviewCreate, ReviewRead
 from app.core.security import current_active_user
+from app.core.cache import review_cache, invalidate_reviews
+from app.utils.ratings import apply_review_delta
+from app.utils.conditional import make_etag, is_not_modified, set_validators, not_modified
 
 router = APIRouter()
 
 @router.get("/book/{book_id}", response_model=List[ReviewRead])
 async def get_book_reviews(
     book_id: int,
+    request: Request,
+    response: Response,
     session: AsyncSession = Depends(get_async_session)
 ):
     """Get all reviews for a specific book"""
+    review_reads, etag, last_modified = await review_cache.get_or_load(
+        book_id, lambda: _load_book_reviews(book_id, session)
+    )
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+
+    set_validators(response, etag, last_modified)
+    return review_reads
+
+async def _load_book_reviews(book_id: int, session: AsyncSession):
+    """Load the reviews of a book together with their (etag, last_modified)"""
+    version_query = select(Book.reviews_version, Book.updated_at).where(Book.id == book_id)
+    version_row = (await session.execute(version_query)).one_or_none()
+    reviews_version, last_modified = version_row if version_row else (0, None)
+
     query = select(Review).where(Review.book_id == book_id).options(selectinload(Review.user)).order_by(Review.created_at.desc())
     result = await session.execute(query)
     reviews = result.scalars().all()
@@ -26,8 +46,10 @@ async def get_book_reviews(
     # Process user_name for each review
     for review in reviews:
         review.user_name = review.user.full_name or review.user.email
-        
-    return reviews
+
+    review_reads = [ReviewRead.model_validate(review) for review in reviews]
+    etag = make_etag("reviews", book_id, reviews_version)
+    return review_reads, etag, last_modified
 
 @router.post("/", response_model=ReviewRead, status_code=status.HTTP_201_CREATED)
 async def create_review(
@@ -58,8 +80,10 @@ async def create_review(
         user_id=user.id
     )
     session.add(new_review)
+    await session.execute(apply_review_delta(new_review.book_id, new_review.rating, 1))
     await session.commit()
     await session.refresh(new_review)
+    invalidate_reviews(new_review.book_id)
     
     # Load user for the response
     await session.refresh(new_review, ["user"])
@@ -88,5 +112,7 @@ async def delete_review(
         )
         
     await session.delete(review)
+    await session.execute(apply_review_delta(review.book_id, review.rating, -1))
     await session.commit()
+    invalidate_reviews(review.book_id)
     return None
@@ -4,6 +4,8 @@ from app.api.books import router as books_router
 from app.api.cart import router as cart_router
 from app.api.payment import router as payment_router
 from app.api.reviews import router as reviews_router
+from app.api.metrics import router as metrics_router
+from app.api.exports import router as exports_router
 from app.core.security import fastapi_users
 from app.schemas.user import UserRead, UserUpdate
 
@@ -42,3 +44,17 @@ api_router.include_router(
     prefix="/reviews",
     tags=["reviews"],
 )
+
+# Operational metrics (admin only)
+api_router.include_router(
+    metrics_router,
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+# Admin data exports
+api_router.include_router(
+    exports_router,
+    prefix="/exports",
+    tags=["exports"],
+)
@@ -0,0 +1,152 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from app.core.config import (
+    CACHE_BOOK_MAXSIZE,
+    CACHE_BOOK_TTL_SECONDS,
+    CACHE_LIST_MAXSIZE,
+    CACHE_LIST_TTL_SECONDS,
+    CACHE_REVIEW_MAXSIZE,
+    CACHE_REVIEW_TTL_SECONDS,
+    CACHE_USER_MAXSIZE,
+    CACHE_USER_TTL_SECONDS,
+    IDEMPOTENCY_CACHE_MAXSIZE,
+    IDEMPOTENCY_TTL_SECONDS,
+)
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with LRU and TTL eviction.
+    Values should be immutable snapshots (schemas, not ORM objects) since
+    they are shared between requests. `generation` moves on every
+    invalidation; a value loaded before that is not stored.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.generation = 0
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        """Store `value`, unless it was loaded under an older `generation`"""
+        if generation is not None and generation != self.generation:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Read-through lookup: call `loader` on a miss and remember its result"""
+        value = self.get(key)
+        if value is MISSING:
+            generation = self.generation
+            value = await loader()
+            self.set(key, value, generation)
+        return value
+
+    def pop(self, key: Hashable):
+        # Also when nothing is cached: a load of `key` may be in flight
+        self.generation += 1
+        if self._data.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self.generation += 1
+        self.invalidations += len(self._data)
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+# BookRead snapshots keyed by book id
+book_cache = TTLCache("books", CACHE_BOOK_MAXSIZE, CACHE_BOOK_TTL_SECONDS)
+# (books, next_cursor, etag) pages of GET /books keyed by the query
+# parameters; any book write clears them all (see invalidate_books)
+book_list_cache = TTLCache("book_lists", CACHE_LIST_MAXSIZE, CACHE_LIST_TTL_SECONDS)
+# ReviewRead lists keyed by book id
+review_cache = TTLCache("reviews", CACHE_REVIEW_MAXSIZE, CACHE_REVIEW_TTL_SECONDS)
+# (token_version, column snapshot) of authenticated users keyed by user id
+user_cache = TTLCache("users", CACHE_USER_MAXSIZE, CACHE_USER_TTL_SECONDS)
+# Stored responses of keyed payment requests (see app/utils/idempotency.py)
+idempotency_cache = TTLCache("idempotency", IDEMPOTENCY_CACHE_MAXSIZE, IDEMPOTENCY_TTL_SECONDS)
+
+caches = [book_cache, book_list_cache, review_cache, user_cache, idempotency_cache]
+
+
+def invalidate_books(*book_ids: int):
+    """Drop cached data for books whose row changed (or was deleted)"""
+    for book_id in book_ids:
+        book_cache.pop(book_id)
+    # Any list page may contain the book or have shifted because of it
+    book_list_cache.clear()
+
+
+def invalidate_catalog():
+    """Drop every cached book and list page, e.g. after a bulk import"""
+    book_cache.clear()
+    book_list_cache.clear()
+
+
+def invalidate_deleted_book(book_id: int):
+    """Drop everything cached about a book that no longer exists"""
+    review_cache.pop(book_id)
+    invalidate_books(book_id)
+
+
+def invalidate_reviews(book_id: int):
+    """Drop cached data after a review of `book_id` was added or removed"""
+    review_cache.pop(book_id)
+    # The book row's review version moved, and rating-sorted pages shift
+    invalidate_books(book_id)
+
+
+def invalidate_user(user_id):
+    """Drop the cached snapshot of a user whose row changed"""
+    user_cache.pop(user_id)
+
+
+def cache_stats() -> list[dict]:
+    return [cache.stats() for cache in caches]
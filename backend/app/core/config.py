@@ -19,4 +19,66 @@ GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 # Stripe keys
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
+# Point at a local fake (benchmarks/fake_stripe.py) for offline load tests
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE")
 
+# Stripe gateway limits
+STRIPE_TIMEOUT_SECONDS = float(os.getenv("STRIPE_TIMEOUT_SECONDS", "10"))
+STRIPE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("STRIPE_CONNECT_TIMEOUT_SECONDS", "3"))
+STRIPE_MAX_CONCURRENCY = int(os.getenv("STRIPE_MAX_CONCURRENCY", "20"))
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", "2"))
+STRIPE_BREAKER_FAILURES = int(os.getenv("STRIPE_BREAKER_FAILURES", "5"))
+STRIPE_BREAKER_RESET_SECONDS = float(os.getenv("STRIPE_BREAKER_RESET_SECONDS", "30"))
+
+# In-process read cache sizing
+CACHE_BOOK_MAXSIZE = int(os.getenv("CACHE_BOOK_MAXSIZE", "2048"))
+CACHE_BOOK_TTL_SECONDS = float(os.getenv("CACHE_BOOK_TTL_SECONDS", "300"))
+CACHE_LIST_MAXSIZE = int(os.getenv("CACHE_LIST_MAXSIZE", "256"))
+CACHE_LIST_TTL_SECONDS = float(os.getenv("CACHE_LIST_TTL_SECONDS", "60"))
+CACHE_REVIEW_MAXSIZE = int(os.getenv("CACHE_REVIEW_MAXSIZE", "1024"))
+CACHE_REVIEW_TTL_SECONDS = float(os.getenv("CACHE_REVIEW_TTL_SECONDS", "300"))
+# Authenticated users; the TTL bounds how long other workers serve a stale role
+CACHE_USER_MAXSIZE = int(os.getenv("CACHE_USER_MAXSIZE", "10000"))
+CACHE_USER_TTL_SECONDS = float(os.getenv("CACHE_USER_TTL_SECONDS", "30"))
+
+# Image uploads
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(256 * 1024)))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+# Response compression
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# Stock held for a pending checkout, and how often expired holds are released
+RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+RESERVATION_SWEEP_SECONDS = float(os.getenv("RESERVATION_SWEEP_SECONDS", "30"))
+
+# Sales tax applied on top of cart prices
+TAX_RATE = float(os.getenv("TAX_RATE", "0.1"))
+
+# Stripe webhook inbox workers
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_POLL_SECONDS = float(os.getenv("WEBHOOK_POLL_SECONDS", "5"))
+
+# Idempotency-Key on payment endpoints: how long responses are replayed,
+# how many stay in memory, and how long an unfinished claim blocks retries
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 60 * 60)))
+IDEMPOTENCY_CACHE_MAXSIZE = int(os.getenv("IDEMPOTENCY_CACHE_MAXSIZE", "2048"))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+
+# GET /payments/orders/{id}/events: open streams allowed per worker,
+# heartbeat interval (also how often the database is rechecked) and the
+# longest a stream stays open before the client reconnects
+ORDER_EVENTS_MAX_SUBSCRIBERS = int(os.getenv("ORDER_EVENTS_MAX_SUBSCRIBERS", "1000"))
+ORDER_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("ORDER_EVENTS_HEARTBEAT_SECONDS", "15"))
+ORDER_EVENTS_STREAM_SECONDS = float(os.getenv("ORDER_EVENTS_STREAM_SECONDS", "300"))
+
+# app.jobs.reconcile_orders: pending orders older than the minimum age are
+# checked with Stripe; ones still unresolved after the flag age are flagged
+RECONCILE_MIN_AGE_SECONDS = int(os.getenv("RECONCILE_MIN_AGE_SECONDS", str(60 * 60)))
+RECONCILE_FLAG_AFTER_SECONDS = int(os.getenv("RECONCILE_FLAG_AFTER_SECONDS", str(48 * 60 * 60)))
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "500"))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "10"))
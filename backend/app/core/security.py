@@ -4,14 +4,19 @@ from typing import Optional
 
 import jwt
 from fastapi import Depends, Request
-from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin
+from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin, exceptions
 from fastapi_users.authentication import (
     AuthenticationBackend,
     BearerTransport,
     JWTStrategy,
 )
 from fastapi_users.db import SQLAlchemyUserDatabase
+from fastapi_users.jwt import decode_jwt, generate_jwt
 from httpx_oauth.clients.google import GoogleOAuth2
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.core.cache import MISSING, invalidate_user, user_cache
 
 from app.core.config import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
@@ -50,6 +55,19 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     ):
         print(f"Verification requested for user {user.id}. Verification token: {token}")
 
+    async def _update(self, user: User, update_dict: dict) -> User:
+        # Every write through the manager (users router, verify, password
+        # reset) lands here. A new password or a deactivation also revokes
+        # the tokens issued so far
+        if update_dict.get("password") is not None or update_dict.get("is_active") is False:
+            update_dict = {**update_dict, "token_version": user.token_version + 1}
+        updated = await super()._update(user, update_dict)
+        invalidate_user(user.id)
+        return updated
+
+    async def on_after_delete(self, user: User, request: Optional[Request] = None):
+        invalidate_user(user.id)
+
 
 async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db)):
     yield UserManager(user_db)
@@ -58,33 +76,87 @@ async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db
 bearer_transport = BearerTransport(tokenUrl="auth/jwt/login")
 
 
+def _snapshot(user: User) -> dict:
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+
+def _detached_user(snapshot: dict) -> User:
+    """
+    A User for this request only, built from a cached snapshot. Detached
+    with its identity, so handlers that write it back (PATCH /users/me)
+    issue an UPDATE, not an INSERT.
+    """
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
+
+class CachedJWTStrategy(JWTStrategy):
+    """
+    JWTStrategy whose tokens carry the user's token_version and which
+    resolves them through user_cache, so most authenticated requests skip
+    the SELECT on `user`. A token whose version is no longer the user's
+    is rejected.
+    """
+
+    async def read_token(self, token: Optional[str], user_manager: UserManager) -> Optional[User]:
+        if token is None:
+            return None
+        try:
+            data = decode_jwt(token, self.decode_key, self.token_audience, algorithms=[self.algorithm])
+            user_id = user_manager.parse_id(data["sub"])
+        except (jwt.PyJWTError, KeyError, exceptions.InvalidID):
+            return None
+        version = data.get("ver", 0)
+
+        cached = user_cache.get(user_id)
+        if cached is not MISSING and cached[0] == version:
+            return _detached_user(cached[1])
+
+        generation = user_cache.generation
+        try:
+            user = await user_manager.get(user_id)
+        except exceptions.UserNotExists:
+            return None
+        if user.token_version != version:
+            return None
+        user_cache.set(user_id, (user.token_version, _snapshot(user)), generation)
+        return user
+
+    async def write_token(self, user: User) -> str:
+        data = {"sub": str(user.id), "aud": self.token_audience, "ver": user.token_version}
+        return generate_jwt(data, self.encode_key, self.lifetime_seconds, algorithm=self.algorithm)
+
+
 def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(
+    return CachedJWTStrategy(
         secret=SECRET_KEY,
         lifetime_seconds=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
     )
 
 
-def create_refresh_token(user_id: uuid.UUID) -> str:
+def create_refresh_token(user_id: uuid.UUID, token_version: int = 0) -> str:
     expires_at = datetime.now(timezone.utc) + timedelta(
         days=REFRESH_TOKEN_EXPIRE_DAYS
     )
     payload = {
         "sub": str(user_id),
         "type": "refresh",
+        "ver": token_version,
         "exp": expires_at,
     }
     return jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 
-def decode_refresh_token(token: str) -> str:
+def decode_refresh_token(token: str) -> tuple[str, int]:
+    """Returns (subject, token version)"""
     payload = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
     if payload.get("type") != "refresh":
         raise jwt.InvalidTokenError("Invalid token type")
     subject = payload.get("sub")
     if not subject:
         raise jwt.InvalidTokenError("Missing subject")
-    return str(subject)
+    return str(subject), int(payload.get("ver", 0))
 
 
 auth_backend = AuthenticationBackend(
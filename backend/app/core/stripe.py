@@ -1,4 +1,221 @@
+import asyncio
+import random
+import ssl
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
 import stripe
-from app.core.config import STRIPE_SECRET_KEY
 
-stripe.api_key = STRIPE_SECRET_KEY
\ No newline at end of file
+from app.core.config import (
+    STRIPE_SECRET_KEY,
+    STRIPE_API_BASE,
+    STRIPE_CONNECT_TIMEOUT_SECONDS,
+    STRIPE_TIMEOUT_SECONDS,
+    STRIPE_MAX_CONCURRENCY,
+    STRIPE_MAX_RETRIES,
+    STRIPE_BREAKER_FAILURES,
+    STRIPE_BREAKER_RESET_SECONDS,
+)
+
+stripe.api_key = STRIPE_SECRET_KEY
+if STRIPE_API_BASE:
+    stripe.api_base = STRIPE_API_BASE
+
+# Backoff between retries: full jitter over base * 2**attempt, capped
+RETRY_BASE_SECONDS = 0.25
+RETRY_MAX_SECONDS = 2.0
+
+
+class StripeUnavailable(Exception):
+    """Stripe calls are short-circuited after repeated failures"""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds; then a single trial call decides whether
+    it closes again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Raises while open; True when this call is the half-open trial"""
+        state = self.state
+        if state == "open" or (state == "half-open" and self.trial_running):
+            raise StripeUnavailable("Payment provider temporarily unavailable")
+        if state == "half-open":
+            self.trial_running = True
+            return True
+        return False
+
+    def end_trial(self):
+        self.trial_running = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+def _is_transient(error: stripe.StripeError) -> bool:
+    """Network trouble, rate limiting and 5xx are worth retrying; 4xx are not"""
+    if isinstance(error, (stripe.APIConnectionError, stripe.RateLimitError)):
+        return True
+    return error.http_status is not None and error.http_status >= 500
+
+
+class PooledHTTPXClient(stripe.HTTPXClient):
+    """Stripe's httpx transport with a bounded keep-alive pool"""
+
+    def __init__(self, timeout: httpx.Timeout, limits: httpx.Limits):
+        super().__init__(timeout=timeout)
+        # The SDK takes no client of ours, so its default unbounded one is
+        # swapped out; it is kept only to be closed along with the pool
+        self._default_client_async = self._client_async
+        self._client_async = httpx.AsyncClient(
+            verify=ssl.create_default_context(cafile=stripe.ca_bundle_path),
+            limits=limits,
+        )
+
+    async def close_async(self):
+        await self._default_client_async.aclose()
+        await super().close_async()
+
+
+class StripeGateway:
+    """
+    Async access to the Stripe API for request handlers: one shared
+    connection pool, strict timeouts, at most `max_concurrency` calls in
+    flight, jittered retries of transient failures (reusing one
+    idempotency key per logical call) and a circuit breaker.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        api_base: Optional[str] = None,
+        timeout: float = STRIPE_TIMEOUT_SECONDS,
+        connect_timeout: float = STRIPE_CONNECT_TIMEOUT_SECONDS,
+        max_concurrency: int = STRIPE_MAX_CONCURRENCY,
+        max_retries: int = STRIPE_MAX_RETRIES,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.http_client = PooledHTTPXClient(
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+        self.client = stripe.StripeClient(
+            api_key,
+            base_addresses={"api": api_base} if api_base else None,
+            http_client=self.http_client,
+            # Retries happen here, where the breaker can see every attempt
+            max_network_retries=0,
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker(STRIPE_BREAKER_FAILURES, STRIPE_BREAKER_RESET_SECONDS)
+
+    async def call(
+        self,
+        operation: Callable[[dict], Awaitable[Any]],
+        idempotent: bool = False,
+        idempotency_key: Optional[str] = None,
+    ) -> Any:
+        """
+        Run `operation(options)` under the concurrency limit, retries and
+        breaker. Idempotent calls use `idempotency_key` when the client sent
+        one, so Stripe also replays across separate requests.
+        """
+        options = {"idempotency_key": idempotency_key or str(uuid.uuid4())} if idempotent else {}
+        attempt = 0
+        while True:
+            trial = self.breaker.before_call()
+            try:
+                async with self.semaphore:
+                    result = await operation(options)
+            except stripe.StripeError as e:
+                if not _is_transient(e):
+                    # The request reached Stripe and was answered
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                # A cancelled trial, or one failing outside the SDK, says
+                # nothing about Stripe but must not keep the trial slot
+                if trial:
+                    self.breaker.end_trial()
+
+            delay = random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def create_checkout_session(self, idempotency_key: Optional[str] = None, **params) -> stripe.checkout.Session:
+        return await self.call(
+            lambda options: self.client.v1.checkout.sessions.create_async(params, options),
+            idempotent=True,
+            idempotency_key=idempotency_key,
+        )
+
+    async def retrieve_checkout_session(self, session_id: str) -> stripe.checkout.Session:
+        return await self.call(
+            lambda options: self.client.v1.checkout.sessions.retrieve_async(session_id, options=options)
+        )
+
+    async def create_payment_intent(self, idempotency_key: Optional[str] = None, **params) -> stripe.PaymentIntent:
+        return await self.call(
+            lambda options: self.client.v1.payment_intents.create_async(params, options),
+            idempotent=True,
+            idempotency_key=idempotency_key,
+        )
+
+    async def retrieve_payment_intent(self, payment_intent_id: str) -> stripe.PaymentIntent:
+        return await self.call(
+            lambda options: self.client.v1.payment_intents.retrieve_async(payment_intent_id, options=options)
+        )
+
+    async def close(self):
+        await self.http_client.close_async()
+
+
+_gateway: Optional[StripeGateway] = None
+
+
+def get_stripe_gateway() -> StripeGateway:
+    global _gateway
+    if _gateway is None:
+        _gateway = StripeGateway(STRIPE_SECRET_KEY or "", STRIPE_API_BASE)
+    return _gateway
+
+
+async def close_stripe_gateway():
+    global _gateway
+    if _gateway is not None:
+        await _gateway.close()
+        _gateway = None
@@ -6,4 +6,11 @@ class Base(DeclarativeBase):
 from app.models.book import Book
 from app.models.user import User
 from app.models.cart import Cart
-from app.models.cart_items import CartItem
\ No newline at end of file
+from app.models.cart_items import CartItem
+from app.models.review import Review
+from app.models.orders import Order
+from app.models.image_ref import ImageRef
+from app.models.reservation import StockReservation
+from app.models.webhook_event import WebhookEvent
+from app.models.idempotency_key import IdempotencyKey
+from app.models.order_items import OrderItem
@@ -0,0 +1,67 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+# create_all does not touch existing tables, so databases created before
+# carts became one-per-user lack the unique indexes the cart upserts'
+# ON CONFLICT clauses need. Duplicates are merged into the oldest row first.
+CART_STATEMENTS = [
+    # Items and orders of a user's extra carts move to their oldest cart
+    """
+    UPDATE cart_items SET cart_id = (
+        SELECT MIN(keeper.id) FROM carts AS keeper
+        JOIN carts AS duplicate ON duplicate.user_id = keeper.user_id
+        WHERE duplicate.id = cart_items.cart_id
+    )
+    WHERE cart_id NOT IN (SELECT MIN(id) FROM carts GROUP BY user_id)
+    """,
+    """
+    UPDATE orders SET cart_id = (
+        SELECT MIN(keeper.id) FROM carts AS keeper
+        JOIN carts AS duplicate ON duplicate.user_id = keeper.user_id
+        WHERE duplicate.id = orders.cart_id
+    )
+    WHERE cart_id NOT IN (SELECT MIN(id) FROM carts GROUP BY user_id)
+    """,
+    "DELETE FROM carts WHERE id NOT IN (SELECT MIN(id) FROM carts GROUP BY user_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_carts_user_id ON carts (user_id)",
+]
+
+CART_ITEM_STATEMENTS = [
+    # A book listed more than once in a cart keeps its first row, with the total quantity
+    """
+    UPDATE cart_items SET quantity = (
+        SELECT SUM(duplicate.quantity) FROM cart_items AS duplicate
+        WHERE duplicate.cart_id = cart_items.cart_id AND duplicate.book_id = cart_items.book_id
+    )
+    WHERE id IN (
+        SELECT MIN(id) FROM cart_items GROUP BY cart_id, book_id HAVING COUNT(*) > 1
+    )
+    """,
+    "DELETE FROM cart_items WHERE id NOT IN (SELECT MIN(id) FROM cart_items GROUP BY cart_id, book_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_cart_items_cart_book ON cart_items (cart_id, book_id)",
+]
+
+
+async def _has_unique_index(conn: AsyncConnection, table: str, columns: list[str]) -> bool:
+    """Whether some unique index of `table` covers exactly `columns`"""
+    indexes = await conn.execute(text(f"PRAGMA index_list({table})"))
+    for index in indexes.mappings().all():
+        if not index["unique"]:
+            continue
+        info = await conn.execute(text(f"PRAGMA index_info({index['name']})"))
+        if [row["name"] for row in info.mappings().all()] == columns:
+            return True
+    return False
+
+
+async def init_cart_constraints(conn: AsyncConnection):
+    """Deduplicate carts and cart items, then add their unique indexes, where missing"""
+    if conn.dialect.name != "sqlite":
+        return
+
+    if not await _has_unique_index(conn, "carts", ["user_id"]):
+        for statement in CART_STATEMENTS:
+            await conn.execute(text(statement))
+    if not await _has_unique_index(conn, "cart_items", ["cart_id", "book_id"]):
+        for statement in CART_ITEM_STATEMENTS:
+            await conn.execute(text(statement))
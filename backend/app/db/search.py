@@ -0,0 +1,70 @@
+import re
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+# External-content FTS5 index over books.title / books.description.
+# Triggers keep it in sync with every write to `books`, whether it comes
+# from the admin endpoints or from payment processing deleting a sold-out book.
+FTS_STATEMENTS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title,
+        description,
+        content='books',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, description ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO books_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+async def init_search_index(conn: AsyncConnection):
+    """Create the FTS5 table and triggers, backfilling it on first creation"""
+    if conn.dialect.name != "sqlite":
+        return
+
+    exists = await conn.scalar(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'")
+    )
+    for statement in FTS_STATEMENTS:
+        await conn.execute(text(statement))
+    if not exists:
+        await conn.execute(text("INSERT INTO books_fts(books_fts) VALUES ('rebuild')"))
+
+
+def build_match_query(raw: str) -> str | None:
+    """
+    Turn free text from the search box into a safe FTS5 MATCH expression.
+    Every word is quoted so user input cannot inject FTS syntax, and the
+    last word is treated as a prefix so results appear while typing.
+    """
+    tokens = _TOKEN_RE.findall(raw)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
@@ -0,0 +1,77 @@
+"""
+Generate thumbnails and WebP variants for images already in uploads/books.
+
+    python -m app.jobs.backfill_image_variants [--force] [--batch-size 50]
+
+Runs in its own process, so it cannot reach the API server's in-process
+caches: books the server already has cached show their new variants once
+those entries expire (CACHE_BOOK_TTL_SECONDS / CACHE_LIST_TTL_SECONDS).
+"""
+import argparse
+import asyncio
+from pathlib import Path
+
+from sqlalchemy import select
+
+import app.db.base  # noqa: F401  registers every model before the others import them
+from app.db.session import async_session_maker, engine
+from app.models.book import Book
+from app.utils.images import build_image_variants, shutdown_image_executor
+
+
+async def backfill(force: bool = False, batch_size: int = 50) -> int:
+    """Walk the books table in id order and fill in missing image variants"""
+    processed = 0
+    last_id = 0
+    async with async_session_maker() as session:
+        while True:
+            result = await session.execute(
+                select(Book).where(Book.id > last_id).order_by(Book.id).limit(batch_size)
+            )
+            books = result.scalars().all()
+            if not books:
+                break
+            last_id = books[-1].id
+
+            pending = {}
+            for book in books:
+                done = set() if force else {entry["src"] for entry in book.image_variants or []}
+                pending[book.id] = [
+                    src for src in book.images
+                    if src not in done and Path(f".{src}").is_file()
+                ]
+
+            # One pool submission for the whole batch keeps every worker busy
+            built = await build_image_variants(
+                [src for paths in pending.values() for src in paths]
+            )
+            by_src = {entry["src"]: entry for entry in built}
+            processed += len(by_src)
+
+            for book in books:
+                if not pending[book.id]:
+                    continue
+                current = {entry["src"]: entry for entry in book.image_variants or []}
+                current.update({src: by_src[src] for src in pending[book.id] if src in by_src})
+                book.image_variants = [current[src] for src in book.images if src in current]
+            await session.commit()
+            print(f"Processed books up to id {last_id} ({processed} images so far)")
+
+    return processed
+
+
+async def main(force: bool, batch_size: int):
+    try:
+        processed = await backfill(force, batch_size)
+    finally:
+        shutdown_image_executor()
+        await engine.dispose()
+    print(f"Generated variants for {processed} images")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill image thumbnails and WebP variants")
+    parser.add_argument("--force", action="store_true", help="regenerate variants that already exist")
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.force, args.batch_size))
@@ -0,0 +1,92 @@
+"""
+Delete stored images that no book references any more.
+
+    python -m app.jobs.gc_uploads [--dry-run] [--grace-hours 24] [--rebuild-refs]
+
+Files younger than the grace period are kept: they may belong to an
+upload whose book has not been committed yet, or come from
+POST /books/upload-image and be attached later.
+"""
+import argparse
+import asyncio
+import time
+from pathlib import Path
+
+from sqlalchemy import select
+
+import app.db.base  # noqa: F401  registers every model before the others import them
+from app.db.session import async_session_maker, engine
+from app.models.book import Book
+from app.models.image_ref import ImageRef
+from app.utils.image_refs import rebuild_image_refs
+from app.utils.uploads import DERIVED_DIR, TEMP_PREFIX, UPLOAD_DIR, UPLOAD_URL_PREFIX
+
+
+async def referenced_paths(rebuild: bool) -> set[str]:
+    """Paths referenced by the ref-count table or directly by any book"""
+    async with async_session_maker() as session:
+        if rebuild:
+            tracked = await rebuild_image_refs(session)
+            await session.commit()
+            print(f"Rebuilt reference counts for {tracked} images")
+
+        referenced = set((await session.scalars(select(ImageRef.path))).all())
+        result = await session.stream(select(Book.images).execution_options(yield_per=500))
+        async for (images,) in result:
+            referenced.update(images or [])
+    return referenced
+
+
+def find_garbage(referenced: set[str], grace_seconds: float) -> list[Path]:
+    cutoff = time.time() - grace_seconds
+    garbage = []
+    originals = set()
+
+    if UPLOAD_DIR.is_dir():
+        for path in UPLOAD_DIR.iterdir():
+            if not path.is_file():
+                continue
+            if path.name.startswith(TEMP_PREFIX):
+                # Leftover of an interrupted upload
+                if path.stat().st_mtime < cutoff:
+                    garbage.append(path)
+                continue
+            if f"{UPLOAD_URL_PREFIX}/{path.name}" in referenced or path.stat().st_mtime >= cutoff:
+                originals.add(path.stem)
+            else:
+                garbage.append(path)
+
+    if DERIVED_DIR.is_dir():
+        for path in DERIVED_DIR.iterdir():
+            # Derived files are named "<original stem>-<suffix>.webp"
+            stem = path.name.rsplit("-", 1)[0]
+            if stem not in originals:
+                garbage.append(path)
+    return garbage
+
+
+async def main(dry_run: bool, grace_hours: float, rebuild: bool):
+    try:
+        referenced = await referenced_paths(rebuild)
+    finally:
+        await engine.dispose()
+
+    garbage = find_garbage(referenced, grace_hours * 3600)
+    freed = 0
+    for path in garbage:
+        freed += path.stat().st_size
+        if dry_run:
+            print(f"would delete {path}")
+        else:
+            path.unlink(missing_ok=True)
+    verb = "Would free" if dry_run else "Freed"
+    print(f"{verb} {freed} bytes in {len(garbage)} files")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Garbage-collect unreferenced uploads")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--grace-hours", type=float, default=24.0)
+    parser.add_argument("--rebuild-refs", action="store_true", help="recount references from books first")
+    args = parser.parse_args()
+    asyncio.run(main(args.dry_run, args.grace_hours, args.rebuild_refs))
@@ -0,0 +1,57 @@
+"""
+Bulk import a supplier catalog from CSV or JSONL.
+
+    python -m app.jobs.import_catalog feed.csv [--format csv] [--batch-size 1000]
+
+CSV needs a header row with title, description, stock, price and
+optionally sku and images ("path1|path2"). JSONL has one object per line
+with the same fields, images as a list. Rows with a sku replace the
+existing book with that sku.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from app.db.session import engine
+from app.db.base import Base
+from app.db.search import init_search_index
+from app.schemas.book import BookImportSummary
+from app.utils.catalog_import import DEFAULT_BATCH_SIZE, IMPORT_FORMATS, detect_format, import_catalog
+
+
+async def main(path: str, fmt: str, batch_size: int):
+    started = time.perf_counter()
+
+    def report(summary: BookImportSummary):
+        elapsed = time.perf_counter() - started
+        print(
+            f"batch {summary.batches}: {summary.processed} rows read, {summary.written} written, "
+            f"{summary.rejected_count} rejected ({summary.processed / elapsed:.0f} rows/s)",
+            flush=True,
+        )
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await init_search_index(conn)
+
+    try:
+        with open(path, "rb") as stream:
+            summary = await import_catalog(stream, fmt, batch_size, on_progress=report)
+    finally:
+        await engine.dispose()
+
+    for rejection in summary.rejected:
+        print(f"line {rejection.line}: {'; '.join(rejection.errors)}", file=sys.stderr)
+    if summary.rejected_count > len(summary.rejected):
+        print(f"... {summary.rejected_count - len(summary.rejected)} more rejected rows", file=sys.stderr)
+    print(f"Imported {summary.written} of {summary.processed} rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import books from CSV or JSONL")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=IMPORT_FORMATS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+    asyncio.run(main(args.path, args.format or detect_format(args.path), args.batch_size))
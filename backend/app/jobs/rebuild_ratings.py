@@ -0,0 +1,26 @@
+"""
+Rebuild the denormalized rating aggregates on `books` from `reviews`.
+
+    python -m app.jobs.rebuild_ratings
+
+Runs in its own process, so it cannot reach the API server's in-process
+caches: ratings the server already has cached are served until those
+entries expire (CACHE_BOOK_TTL_SECONDS / CACHE_LIST_TTL_SECONDS).
+"""
+import asyncio
+
+import app.db.base  # noqa: F401  registers every model before the others import them
+from app.db.session import async_session_maker, engine
+from app.utils.ratings import rebuild_rating_aggregates
+
+
+async def main():
+    async with async_session_maker() as session:
+        reviewed = await rebuild_rating_aggregates(session)
+        await session.commit()
+    await engine.dispose()
+    print(f"Rebuilt rating aggregates ({reviewed} books with reviews)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
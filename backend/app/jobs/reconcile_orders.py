@@ -0,0 +1,221 @@
+"""
+Settle pending orders whose Stripe webhook never arrived.
+
+    python -m app.jobs.reconcile_orders [--dry-run] [--min-age-minutes 60] [--concurrency 10]
+
+Meant to run from cron (e.g. every 15 minutes). Pending orders older than
+the minimum age are walked in id order, batch by batch, and their
+checkout session or payment intent is looked up with bounded concurrency:
+
+* paid -> completed through process_successful_payment from the lines
+  recorded at checkout (the user's cart is left alone); an order without
+  recorded lines is flagged instead, since what was paid for is unknown;
+* session expired / intent canceled, or never sent to Stripe -> "expired",
+  with its stock reservations released;
+* unknown to Stripe, or still open after the flag age -> "flagged" for a
+  human to look at (a late webhook can still complete it).
+
+Everything else stays pending for the next run. The run stops early if
+the Stripe circuit breaker opens.
+
+The job runs in its own process: the catalog cache invalidations and
+order event publishes done on completion stay in it. The API server's
+cached books catch up when their TTL expires, and open order event
+streams see the new status at their next database recheck.
+"""
+import argparse
+import asyncio
+from collections import Counter
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy import select, update
+
+import app.db.base  # noqa: F401  registers every model before the others import them
+from app.api.payment import order_locks, process_successful_payment
+from app.core.config import (
+    RECONCILE_BATCH_SIZE,
+    RECONCILE_CONCURRENCY,
+    RECONCILE_FLAG_AFTER_SECONDS,
+    RECONCILE_MIN_AGE_SECONDS,
+    STRIPE_API_BASE,
+    STRIPE_SECRET_KEY,
+)
+from app.core.stripe import StripeGateway, StripeUnavailable, stripe
+from app.db.session import async_session_maker, engine
+from app.models.order_items import OrderItem
+from app.models.orders import Order
+from app.utils.reservations import release_order_reservations
+from app.utils.timestamps import utcnow
+
+PAID_SESSION_STATUSES = {"paid", "no_payment_required"}
+
+
+async def decide(gateway: StripeGateway, order, flag_before) -> str:
+    """"complete", "expire", "flag" or "skip" for one pending order row"""
+    if not order.stripe_session_id and not order.stripe_payment_intent_id:
+        # The checkout failed before Stripe was called
+        return "expire"
+
+    try:
+        finished = []
+        if order.stripe_session_id:
+            checkout_session = await gateway.retrieve_checkout_session(order.stripe_session_id)
+            if checkout_session.payment_status in PAID_SESSION_STATUSES:
+                return "complete"
+            finished.append(checkout_session.status == "expired")
+        if order.stripe_payment_intent_id:
+            payment_intent = await gateway.retrieve_payment_intent(order.stripe_payment_intent_id)
+            if payment_intent.status == "succeeded":
+                return "complete"
+            finished.append(payment_intent.status == "canceled")
+    except stripe.InvalidRequestError as e:
+        if e.http_status == 404:
+            return "flag"
+        raise
+
+    if all(finished):
+        return "expire"
+    return "flag" if order.created_at < flag_before else "skip"
+
+
+async def complete_order(order_id: int) -> Optional[bool]:
+    """
+    Complete a paid order from its recorded lines. None when it has none
+    (checked out before lines were recorded), so it should be flagged
+    """
+    async with order_locks(order_id):
+        async with async_session_maker() as session:
+            has_lines = await session.scalar(
+                select(OrderItem.id).where(OrderItem.order_id == order_id).limit(1)
+            )
+            if has_lines is None:
+                return None
+            order = await session.get(Order, order_id)
+            return await process_successful_payment(order, session, clear_cart=False)
+
+
+async def settle(order_ids: list[int], status: str) -> int:
+    """Move still-pending orders to `status`, releasing their stock holds"""
+    if not order_ids:
+        return 0
+    async with async_session_maker() as session:
+        result = await session.execute(
+            update(Order)
+            .where(Order.id.in_(order_ids), Order.status == "pending")
+            .values(status=status)
+            .returning(Order.id)
+            .execution_options(synchronize_session=False)
+        )
+        settled = list(result.scalars())
+        await release_order_reservations(session, *settled)
+        await session.commit()
+    return len(settled)
+
+
+async def pending_batch(after_id: int, cutoff, batch_size: int) -> list:
+    """Next `batch_size` pending orders created before `cutoff`, in id order"""
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(Order.id, Order.stripe_session_id, Order.stripe_payment_intent_id, Order.created_at)
+            .where(Order.status == "pending", Order.id > after_id, Order.created_at < cutoff)
+            .order_by(Order.id)
+            .limit(batch_size)
+        )
+        return result.all()
+
+
+async def reconcile(
+    min_age: float = RECONCILE_MIN_AGE_SECONDS,
+    flag_after: float = RECONCILE_FLAG_AFTER_SECONDS,
+    batch_size: int = RECONCILE_BATCH_SIZE,
+    concurrency: int = RECONCILE_CONCURRENCY,
+    dry_run: bool = False,
+    gateway: Optional[StripeGateway] = None,
+) -> Counter:
+    """Run one reconciliation pass and count what happened to the orders"""
+    now = utcnow()
+    cutoff = now - timedelta(seconds=min_age)
+    flag_before = now - timedelta(seconds=flag_after)
+    own_gateway = gateway is None
+    if own_gateway:
+        gateway = StripeGateway(STRIPE_SECRET_KEY or "", STRIPE_API_BASE, max_concurrency=concurrency)
+
+    counts = Counter()
+    last_id = 0
+    try:
+        while True:
+            orders = await pending_batch(last_id, cutoff, batch_size)
+            if not orders:
+                break
+            last_id = orders[-1].id
+
+            # The gateway's semaphore bounds how many lookups are in flight
+            decisions = await asyncio.gather(
+                *(decide(gateway, order, flag_before) for order in orders), return_exceptions=True
+            )
+            by_decision: dict[str, list[int]] = {}
+            unavailable = False
+            for order, decision in zip(orders, decisions):
+                if isinstance(decision, StripeUnavailable):
+                    unavailable = True
+                    decision = "skip"
+                elif isinstance(decision, Exception):
+                    print(f"Order {order.id}: lookup failed: {decision!r}")
+                    decision = "error"
+                by_decision.setdefault(decision, []).append(order.id)
+            counts["checked"] += len(orders)
+            counts["skipped"] += len(by_decision.get("skip", []))
+            counts["errors"] += len(by_decision.get("error", []))
+
+            if dry_run:
+                counts["completed"] += len(by_decision.get("complete", []))
+                counts["expired"] += len(by_decision.get("expire", []))
+                counts["flagged"] += len(by_decision.get("flag", []))
+            else:
+                unrecorded = []
+                for order_id in by_decision.get("complete", []):
+                    completed = await complete_order(order_id)
+                    if completed is None:
+                        unrecorded.append(order_id)
+                    else:
+                        counts["completed"] += completed
+                counts["expired"] += await settle(by_decision.get("expire", []), "expired")
+                counts["flagged"] += await settle(by_decision.get("flag", []) + unrecorded, "flagged")
+            print(f"Reconciled orders up to id {last_id}: {dict(counts)}")
+
+            if unavailable:
+                print("Stripe is unavailable, stopping; the rest is left for the next run")
+                break
+    finally:
+        if own_gateway:
+            await gateway.close()
+    return counts
+
+
+async def main(args):
+    try:
+        counts = await reconcile(
+            min_age=args.min_age_minutes * 60,
+            flag_after=args.flag_after_hours * 3600,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            dry_run=args.dry_run,
+        )
+    finally:
+        await engine.dispose()
+    verb = "Would settle" if args.dry_run else "Settled"
+    print(
+        f"{verb} {counts['completed']} completed, {counts['expired']} expired, "
+        f"{counts['flagged']} flagged of {counts['checked']} pending orders"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile stuck pending orders with Stripe")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    parser.add_argument("--min-age-minutes", type=float, default=RECONCILE_MIN_AGE_SECONDS / 60)
+    parser.add_argument("--flag-after-hours", type=float, default=RECONCILE_FLAG_AFTER_SECONDS / 3600)
+    parser.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=RECONCILE_CONCURRENCY)
+    asyncio.run(main(parser.parse_args()))
@@ -1,10 +1,19 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from app.db.base import Base
 from app.db.session import engine, async_session_maker
+from app.db.search import init_search_index
+from app.db.cart_constraints import init_cart_constraints
 from app.api.routers import api_router
+from app.core.stripe import close_stripe_gateway
+from app.utils.compression import CompressionMiddleware
+from app.utils.images import shutdown_image_executor
+from app.utils.reservations import run_reservation_sweeper
+from app.utils.webhook_inbox import webhook_inbox
+from app.api.payment import handle_stripe_event
+from app.utils.static import UploadStaticFiles
 from app.models.user import User
 from fastapi_users.password import PasswordHelper
 from pathlib import Path
@@ -14,6 +23,8 @@ async def lifespan(app: FastAPI):
     # Startup: Create tables
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await init_search_index(conn)
+        await init_cart_constraints(conn)
     
     # Create default admin user if not exists
     async with async_session_maker() as session:
@@ -40,8 +51,17 @@ async def lifespan(app: FastAPI):
         else:
             print("Admin user already exists")
     
+    # Release stock held by checkouts that were never paid
+    sweeper = asyncio.create_task(run_reservation_sweeper())
+    # Apply stored Stripe webhook events, including ones left from a restart
+    webhook_inbox.start(handle_stripe_event)
+
     yield
     # Shutdown
+    sweeper.cancel()
+    await webhook_inbox.stop()
+    shutdown_image_executor()
+    await close_stripe_gateway()
     await engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
@@ -51,7 +71,7 @@ uploads_dir = Path("uploads/books")
 uploads_dir.mkdir(parents=True, exist_ok=True)
 
 # Mount static files for uploaded images
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/uploads", UploadStaticFiles(directory="uploads"), name="uploads")
 
 # CORS configuration
 app.add_middleware(
@@ -67,8 +87,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
 )
 
+# Negotiated br/gzip for JSON and other text responses
+app.add_middleware(CompressionMiddleware)
+
 app.include_router(api_router)
 
 @app.get("/")
@@ -1,19 +1,71 @@
-from sqlalchemy import Integer, String, JSON, Float
+from sqlalchemy import Integer, String, JSON, Float, Index, DateTime, func, literal_column
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base import Base
-from typing import List, TYPE_CHECKING
+from datetime import datetime
+from typing import List, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from app.models.review import Review
 
 class Book(Base):
     __tablename__ = "books"
+    __table_args__ = (
+        # Back the keyset orderings used by GET /books
+        Index("ix_books_price_id", "price", "id"),
+        Index("ix_books_title_id", "title", "id"),
+        Index("ix_books_stock_price", "stock", "price"),
+        Index("ix_books_rating_avg_id", "rating_avg", "id"),
+        # Incremental exports
+        Index("ix_books_updated_at", "updated_at"),
+    )
+    # Fetch server-generated version/updated_at on flush instead of lazily
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    # Supplier identifier used to upsert rows from bulk imports
+    sku: Mapped[Optional[str]] = mapped_column(String, unique=True, nullable=True)
     title: Mapped[str] = mapped_column(String, nullable=False)
     description: Mapped[str] = mapped_column(String, nullable=False)
     stock: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
+    # Copies held by pending checkouts (see app/utils/reservations.py)
+    reserved: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
     price: Mapped[float] = mapped_column(Float, nullable=False)
     images: Mapped[List[str]] = mapped_column(JSON, default=list, nullable=False)
+    # Per-image size and derivative URLs, filled in after upload (see app/utils/images.py)
+    image_variants: Mapped[List[dict]] = mapped_column(JSON, default=list, server_default="[]", nullable=False)
+    # Bumped on every UPDATE of the row; feeds the ETag of GET /books/{id}
+    version: Mapped[int] = mapped_column(
+        Integer, default=1, server_default="1", onupdate=literal_column("version + 1"), nullable=False
+    )
+    # Bumped whenever a review of this book is added or removed
+    reviews_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Review aggregates, maintained incrementally by the reviews endpoints
+    # (see app/utils/ratings.py) and rebuilt by app.jobs.rebuild_ratings
+    review_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    rating_avg: Mapped[float] = mapped_column(Float, default=0.0, server_default="0", nullable=False)
+    rating_1_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    rating_2_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    rating_3_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    rating_4_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    rating_5_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
     
-    reviews: Mapped[list["Review"]] = relationship("Review", back_populates="book", cascade="all, delete-orphan", lazy="noload")
\ No newline at end of file
+    reviews: Mapped[list["Review"]] = relationship("Review", back_populates="book", cascade="all, delete-orphan", lazy="noload")
+
+    @property
+    def available(self) -> int:
+        """Copies that can still be put into a new checkout"""
+        return max(0, self.stock - self.reserved)
+
+    @property
+    def rating_histogram(self) -> List[int]:
+        """Number of 1..5 star reviews, in that order"""
+        return [
+            self.rating_1_count,
+            self.rating_2_count,
+            self.rating_3_count,
+            self.rating_4_count,
+            self.rating_5_count,
+        ]
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, Integer, DateTime
+from sqlalchemy import ForeignKey, Integer, DateTime, UniqueConstraint
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.sql import func
 from app.db.base import Base
@@ -8,6 +8,11 @@ from datetime import datetime
 
 class CartItem(Base):
     __tablename__ = "cart_items"
+    # A book appears once per cart; adding it again bumps the quantity.
+    # Its leading cart_id column also serves per-cart lookups and the summary
+    __table_args__ = (
+        UniqueConstraint("cart_id", "book_id", name="uq_cart_items_cart_book"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     cart_id: Mapped[int] = mapped_column(Integer, ForeignKey("carts.id"), nullable=False)
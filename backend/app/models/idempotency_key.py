@@ -0,0 +1,26 @@
+from sqlalchemy import DateTime, Index, Integer, JSON, String
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+from datetime import datetime
+from typing import Optional
+
+class IdempotencyKey(Base):
+    """Responses of keyed payment requests, replayed when the key is sent again"""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        # Purging a user's expired keys
+        Index("ix_idempotency_keys_user_expires", "user_id", "expires_at"),
+    )
+
+    # Scoped to the user and endpoint, so clients cannot collide
+    user_id: Mapped[str] = mapped_column(String, primary_key=True)
+    endpoint: Mapped[str] = mapped_column(String, primary_key=True)
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    # Hash of the request body; reusing a key for another request is an error
+    fingerprint: Mapped[str] = mapped_column(String, nullable=False)
+    # Null while the first request is still running
+    status_code: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    response: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    # Naive UTC. A claim that never completed can be taken over after locked_until
+    locked_until: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
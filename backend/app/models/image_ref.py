@@ -0,0 +1,12 @@
+from sqlalchemy import DateTime, Integer, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+from datetime import datetime
+
+class ImageRef(Base):
+    """How many book image slots point at a stored upload"""
+    __tablename__ = "image_refs"
+
+    path: Mapped[str] = mapped_column(String, primary_key=True)
+    ref_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
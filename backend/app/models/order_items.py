@@ -0,0 +1,19 @@
+from sqlalchemy import Float, ForeignKey, Integer, String
+from sqlalchemy.orm import relationship, Mapped, mapped_column
+from app.db.base import Base
+from app.models.orders import Order
+from typing import Optional
+
+class OrderItem(Base):
+    """One purchased line, copied from the cart at checkout"""
+    __tablename__ = "order_items"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    order_id: Mapped[int] = mapped_column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    # No foreign key: sold-out books are deleted, their order lines stay
+    book_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    title: Mapped[str] = mapped_column(String, nullable=False)
+    unit_price: Mapped[float] = mapped_column(Float, nullable=False)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    order = relationship("Order", back_populates="items")
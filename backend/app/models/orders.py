@@ -1,5 +1,5 @@
 import sqlalchemy
-from sqlalchemy import DateTime, Integer, String, ForeignKey, func
+from sqlalchemy import DateTime, Index, Integer, String, ForeignKey, func
 from fastapi_users_db_sqlalchemy import GUID
 import uuid
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -7,9 +7,20 @@ from app.db.base import Base
 from app.models.cart import Cart
 from datetime import datetime
 from app.models.user import User
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from app.models.order_items import OrderItem
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Order history, newest first. SQLite appends the rowid (id) to
+        # every index, so the (created_at, id) keyset is fully covered
+        Index("ix_orders_user_created", "user_id", "created_at"),
+        # Reconciliation's keyset walk over pending orders (status, id)
+        Index("ix_orders_status", "status"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[uuid.UUID] = mapped_column(GUID, ForeignKey("user.id"), nullable=False)
@@ -19,7 +30,10 @@ class Order(Base):
     stripe_payment_intent_id: Mapped[str] = mapped_column(String, unique=True, nullable=True)
     stripe_session_id: Mapped[str] = mapped_column(String, unique=True, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
-    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
     
     user: Mapped["User"] = relationship("User", back_populates="orders")
-    cart: Mapped["Cart"] = relationship("Cart")
\ No newline at end of file
+    cart: Mapped["Cart"] = relationship("Cart")
+    items: Mapped[list["OrderItem"]] = relationship(
+        "OrderItem", back_populates="order", cascade="all, delete-orphan", order_by="OrderItem.id"
+    )
\ No newline at end of file
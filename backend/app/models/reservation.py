@@ -0,0 +1,16 @@
+from sqlalchemy import DateTime, ForeignKey, Integer, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+from datetime import datetime
+
+class StockReservation(Base):
+    """Copies of a book held for a pending order until `expires_at`"""
+    __tablename__ = "stock_reservations"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    order_id: Mapped[int] = mapped_column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    book_id: Mapped[int] = mapped_column(Integer, ForeignKey("books.id"), nullable=False)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Naive UTC, like the other server-side timestamps; scanned by the sweeper
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,26 @@
+from sqlalchemy import DateTime, Index, Integer, JSON, String
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+from datetime import datetime
+from typing import Optional
+
+class WebhookEvent(Base):
+    """Stripe events as received, drained by the webhook inbox workers"""
+    __tablename__ = "webhook_events"
+    __table_args__ = (
+        # The workers' "next due event" scan
+        Index("ix_webhook_events_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    # Stripe's event id; a redelivered event hits this key and is dropped
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    type: Mapped[str] = mapped_column(String, nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    # pending -> processed, or failed after WEBHOOK_MAX_ATTEMPTS
+    status: Mapped[str] = mapped_column(String, default="pending", nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_error: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # Naive UTC, like the other timestamps the workers compare against
+    received_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    processed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
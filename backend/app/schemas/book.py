@@ -1,16 +1,46 @@
 from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
+from datetime import datetime
 from app.schemas.review import ReviewRead
 
+class ImageVariant(BaseModel):
+    kind: str
+    url: str
+    width: int
+    height: int
+    format: str
+
+class BookImage(BaseModel):
+    src: str
+    width: int
+    height: int
+    srcset: str = ""
+    variants: List[ImageVariant] = []
+
 class BookRead(BaseModel):
     id: int
+    sku: Optional[str] = None
     title: str
     description: str
     stock: int
+    reserved: int = 0
+    available: int = 0
     price: float
     images: List[str] = []
+    image_variants: List[BookImage] = []
+    version: int = 1
+    updated_at: Optional[datetime] = None
+    review_count: int = 0
+    rating_sum: int = 0
+    rating_avg: float = 0.0
+    rating_histogram: List[int] = [0, 0, 0, 0, 0]
     model_config = ConfigDict(from_attributes=True)
 
+class BookSearchResult(BookRead):
+    score: float
+    title_snippet: str
+    description_snippet: str
+
 class BookCreate(BaseModel):
     title: str
     description: str
@@ -19,6 +49,29 @@ class BookCreate(BaseModel):
     images: List[str] = []
     model_config = ConfigDict(from_attributes=True)
 
+class BookImportRow(BookCreate):
+    sku: Optional[str] = Field(None, min_length=1)
+    stock: int = Field(ge=0)
+    price: float = Field(ge=0)
+
+class BookImportRejection(BaseModel):
+    line: int
+    errors: List[str]
+
+class BookImportSummary(BaseModel):
+    processed: int = 0
+    written: int = 0
+    batches: int = 0
+    rejected_count: int = 0
+    rejected: List[BookImportRejection] = []
+
+class BookBatchRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1)
+
+class BookBatchResult(BaseModel):
+    books: List[BookRead]
+    missing: List[int] = []
+
 class BookUpdate(BaseModel):
     title: str | None = None
     description: str | None = None
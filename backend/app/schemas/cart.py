@@ -1,5 +1,5 @@
-from pydantic import BaseModel, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Literal, Optional
 from datetime import datetime
 import uuid
 
@@ -9,6 +9,7 @@ class CartItemBookRead(BaseModel):
     title: str
     description: str
     stock: int
+    available: int = 0
     price: float
     images: List[str] = []
 
@@ -42,3 +43,31 @@ class CartRead(CartBase):
     items: List[CartItemRead] = []
 
     model_config = ConfigDict(from_attributes=True)
+
+class CartBatchOperation(BaseModel):
+    """add: increase by quantity, set: replace the quantity (0 removes), remove: drop the book"""
+    op: Literal["add", "set", "remove"]
+    book_id: int
+    quantity: int = 1
+
+class CartBatchRequest(BaseModel):
+    operations: List[CartBatchOperation] = Field(..., min_length=1, max_length=500)
+    # All-or-nothing by default; with False, invalid operations are skipped
+    atomic: bool = True
+
+class CartBatchFailure(BaseModel):
+    index: int
+    book_id: int
+    detail: str
+
+class CartBatchResult(BaseModel):
+    cart: CartRead
+    failed: List[CartBatchFailure] = []
+
+class CartSummary(BaseModel):
+    cart_id: Optional[int] = None
+    item_count: int = 0
+    distinct_items: int = 0
+    subtotal: float = 0.0
+    tax: float = 0.0
+    total: float = 0.0
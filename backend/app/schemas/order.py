@@ -22,6 +22,19 @@ class OrderRead(OrderBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class OrderItemRead(BaseModel):
+    """A purchased line as it was at completion time"""
+    id: int
+    book_id: Optional[int] = None
+    title: str
+    unit_price: float
+    quantity: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+class OrderDetail(OrderRead):
+    items: List[OrderItemRead] = []
+
 class OrderUpdate(BaseModel):
     status: str
 
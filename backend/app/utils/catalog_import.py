@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+import os
+from itertools import islice
+from typing import BinaryIO, Callable, Iterator, Optional
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from starlette.concurrency import run_in_threadpool
+
+from app.core.cache import invalidate_catalog
+from app.db.session import async_session_maker
+from app.models.book import Book
+from app.schemas.book import BookImportRejection, BookImportRow, BookImportSummary
+from app.utils.image_refs import acquire_images, delete_released_files, release_images
+
+IMPORT_FORMATS = ("csv", "jsonl")
+DEFAULT_BATCH_SIZE = 1000
+# Rejections beyond this are only counted, to keep the summary small
+MAX_REPORTED_REJECTIONS = 100
+# CSV carries images as "path1|path2"
+CSV_IMAGE_SEPARATOR = "|"
+
+
+def detect_format(filename: Optional[str]) -> str:
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    if extension == "csv":
+        return "csv"
+    raise HTTPException(status_code=400, detail="Cannot tell the import format; pass csv or jsonl")
+
+
+def iter_raw_rows(stream: BinaryIO, fmt: str) -> Iterator[tuple[int, object]]:
+    """Yield (line number, raw row or parse error) without reading ahead"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            for row in reader:
+                images = row.get("images") or ""
+                row["images"] = [path.strip() for path in images.split(CSV_IMAGE_SEPARATOR) if path.strip()]
+                row["sku"] = row.get("sku") or None
+                yield reader.line_num, row
+        else:
+            for line, raw in enumerate(text, start=1):
+                if not raw.strip():
+                    continue
+                try:
+                    yield line, json.loads(raw)
+                except json.JSONDecodeError as e:
+                    yield line, e
+    finally:
+        # The caller owns the underlying file
+        text.detach()
+
+
+def _take(rows: Iterator, size: int) -> list:
+    return list(islice(rows, size))
+
+
+def _upsert_statement():
+    stmt = insert(Book)
+    return stmt.on_conflict_do_update(
+        index_elements=[Book.sku],
+        set_={
+            Book.title: stmt.excluded.title,
+            Book.description: stmt.excluded.description,
+            Book.stock: stmt.excluded.stock,
+            Book.price: stmt.excluded.price,
+            Book.images: stmt.excluded.images,
+            # onupdate defaults do not apply to ON CONFLICT DO UPDATE
+            Book.version: Book.version + 1,
+            Book.updated_at: func.now(),
+        },
+    )
+
+
+async def _write_batch(rows: list[dict]):
+    """Upsert one batch in a single transaction, moving image references along"""
+    skus = [row["sku"] for row in rows if row["sku"] is not None]
+    async with async_session_maker() as session:
+        previous_images = []
+        if skus:
+            result = await session.execute(select(Book.images).where(Book.sku.in_(skus)))
+            previous_images = [path for (images,) in result.all() for path in images or []]
+
+        await session.execute(_upsert_statement(), rows)
+        await acquire_images(session, [path for row in rows for path in row["images"]])
+        unreferenced = await release_images(session, previous_images)
+        await session.commit()
+    await delete_released_files(unreferenced)
+
+
+async def import_catalog(
+    stream: BinaryIO,
+    fmt: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    on_progress: Optional[Callable[[BookImportSummary], None]] = None,
+) -> BookImportSummary:
+    """
+    Stream a CSV or JSONL catalog into `books`, validating every row
+    against BookImportRow. Rows are upserted by sku (rows without one are
+    inserted) in batches of `batch_size`, one transaction per batch, so
+    memory stays flat regardless of file size.
+    """
+    summary = BookImportSummary()
+    rows = iter_raw_rows(stream, fmt)
+
+    def reject(line: int, errors: list[str]):
+        summary.rejected_count += 1
+        if len(summary.rejected) < MAX_REPORTED_REJECTIONS:
+            summary.rejected.append(BookImportRejection(line=line, errors=errors))
+
+    try:
+        while raw_batch := await run_in_threadpool(_take, rows, batch_size):
+            valid = {}
+            for line, raw in raw_batch:
+                summary.processed += 1
+                if isinstance(raw, Exception):
+                    reject(line, [f"Invalid JSON: {raw}"])
+                    continue
+                try:
+                    row = BookImportRow.model_validate(raw)
+                except ValidationError as e:
+                    reject(line, [
+                        f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+                        for error in e.errors()
+                    ])
+                    continue
+                # A sku repeated within the batch keeps its last row
+                key = row.sku if row.sku is not None else ("line", line)
+                valid[key] = row.model_dump()
+
+            if valid:
+                await _write_batch(list(valid.values()))
+                invalidate_catalog()
+            summary.written += len(valid)
+            summary.batches += 1
+            if on_progress:
+                on_progress(summary)
+    finally:
+        rows.close()
+
+    return summary
@@ -0,0 +1,180 @@
+import zlib
+from typing import Optional
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import BROTLI_QUALITY, COMPRESSION_MINIMUM_SIZE, GZIP_LEVEL
+from app.utils.static import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip alone still works
+    brotli = None
+
+# Already compressed, or streamed where buffering inside the compressor hurts
+EXCLUDED_MEDIA_TYPES = {
+    "application/gzip",
+    "application/x-gzip",
+    "application/zip",
+    "font/woff",
+    "font/woff2",
+    "image/avif",
+    "image/gif",
+    "image/jpeg",
+    "image/png",
+    "image/webp",
+    "text/event-stream",
+}
+EXCLUDED_MAJOR_TYPES = {"audio", "video"}
+
+# Chunks at least this large are compressed off the event loop
+THREAD_MINIMUM_SIZE = 128 * 1024
+
+
+class GzipEncoder:
+    content_encoding = "gzip"
+
+    def __init__(self, level: int):
+        self.level = level
+        self._compressor = None
+
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        # Allocated on first use; most responses are too small to compress
+        if self._compressor is None:
+            self._compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        if more_body:
+            return self._compressor.compress(body) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return self._compressor.compress(body) + self._compressor.flush()
+
+
+class BrotliEncoder:
+    content_encoding = "br"
+
+    def __init__(self, quality: int):
+        self.quality = quality
+        self._compressor = None
+
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = brotli.Compressor(quality=self.quality)
+        if more_body:
+            return self._compressor.process(body) + self._compressor.flush()
+        return self._compressor.process(body) + self._compressor.finish()
+
+
+def is_compressible(start: Message) -> bool:
+    """False for partial, already encoded and binary media responses"""
+    if start["status"] == 206:
+        return False
+    headers = Headers(raw=start["headers"])
+    if "content-encoding" in headers:
+        return False
+    media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+    return media_type not in EXCLUDED_MEDIA_TYPES and media_type.partition("/")[0] not in EXCLUDED_MAJOR_TYPES
+
+
+class CompressionResponder:
+    """
+    Wraps `send` for one response. The start message is held back until
+    the first body chunk shows whether the response is worth compressing.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int, encoder):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoder = encoder
+        self.send: Optional[Send] = None
+        self.start: Optional[Message] = None
+        self.passthrough = False
+        self.started = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def compress(self, body: bytes, more_body: bool) -> bytes:
+        if len(body) >= THREAD_MINIMUM_SIZE:
+            return await anyio.to_thread.run_sync(self.encoder.compress, body, more_body)
+        return self.encoder.compress(body, more_body)
+
+    async def send_compressed(self, message: Message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start = message
+            self.passthrough = not is_compressible(message)
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message_type != "http.response.body" or self.passthrough:
+            if message_type == "http.response.pathsend" and not self.passthrough:
+                # Zero-copy file sends go out as they are
+                self.passthrough = True
+                await self.send(self.start)
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.started:
+            message["body"] = await self.compress(body, more_body)
+            await self.send(message)
+            return
+
+        self.started = True
+        if len(body) < self.minimum_size and not more_body:
+            self.passthrough = True
+            await self.send(self.start)
+            await self.send(message)
+            return
+
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers.add_vary_header("Accept-Encoding")
+        if self.encoder is None:
+            self.passthrough = True
+        else:
+            message["body"] = await self.compress(body, more_body)
+            headers["Content-Encoding"] = self.encoder.content_encoding
+            if more_body or self.start.get("trailers", False):
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(message["body"]))
+        await self.send(self.start)
+        await self.send(message)
+
+
+class CompressionMiddleware:
+    """
+    Negotiated response compression: brotli when the client accepts it and
+    the brotli package is installed, gzip otherwise. Responses under
+    `minimum_size`, already encoded ones and binary media types go out
+    untouched.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MINIMUM_SIZE,
+        compresslevel: int = GZIP_LEVEL,
+        brotli_quality: int = BROTLI_QUALITY,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = accepted_encodings(Headers(scope=scope))
+        if brotli is not None and "br" in accepted:
+            encoder = BrotliEncoder(self.brotli_quality)
+        elif "gzip" in accepted:
+            encoder = GzipEncoder(self.compresslevel)
+        else:
+            encoder = None
+        await CompressionResponder(self.app, self.minimum_size, encoder)(scope, receive, send)
@@ -0,0 +1,63 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Iterable, Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag derived from the version data identifying a representation"""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def latest(timestamps: Iterable[Optional[datetime]]) -> Optional[datetime]:
+    values = [ts for ts in timestamps if ts is not None]
+    return max(values, key=_as_utc) if values else None
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; they are stored in UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    Evaluate If-None-Match / If-Modified-Since (RFC 9110 §13.2.2).
+    If-None-Match wins when both are present.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison is the rule for GET
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return _as_utc(last_modified) <= since
+    return False
+
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime] = None):
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    # Let clients keep a copy but always revalidate it
+    response.headers["Cache-Control"] = "no-cache"
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    response = Response(status_code=304)
+    set_validators(response, etag, last_modified)
+    return response
@@ -0,0 +1,95 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import Select, String, type_coerce
+
+from app.db.session import async_session_maker
+
+EXPORT_FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Rows fetched per round trip from the server-side cursor
+EXPORT_FETCH_SIZE = 1000
+# Bytes buffered before a chunk is handed to the client
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def as_utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored as naive UTC; make filters comparable"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def changed_since(column, since: datetime):
+    """
+    `column >= since` for a func.now() timestamp. SQLite stores those as
+    "YYYY-MM-DD HH:MM:SS" text and compares them as text, while a bound
+    datetime renders with microseconds; so the bound is cut to the same
+    whole-second text, and rows from the boundary second are included.
+    """
+    bound = as_utc_naive(since).replace(microsecond=0)
+    return type_coerce(column, String) >= bound.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _csv_value(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, separators=(",", ":"))
+    return value
+
+
+async def _encoded_rows(query: Select, schema: type[BaseModel], fmt: str) -> AsyncIterator[bytes]:
+    fields = list(schema.model_fields)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    if fmt == "csv":
+        writer.writeheader()
+
+    async with async_session_maker() as session:
+        result = await session.stream_scalars(query.execution_options(yield_per=EXPORT_FETCH_SIZE))
+        async for row in result:
+            data = schema.model_validate(row).model_dump(mode="json")
+            if fmt == "csv":
+                writer.writerow({key: _csv_value(value) for key, value in data.items()})
+            else:
+                buffer.write(json.dumps(data, separators=(",", ":")))
+                buffer.write("\n")
+            if buffer.tell() >= EXPORT_CHUNK_BYTES:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+            # Nothing is kept past this row, so memory stays flat
+            session.expunge(row)
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def _gzipped(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(query: Select, schema: type[BaseModel], fmt: str, gzip: bool) -> AsyncIterator[bytes]:
+    """
+    Stream the rows of `query` as NDJSON or CSV, optionally gzipped on the
+    fly, through a server-side cursor in its own session.
+    """
+    chunks = _encoded_rows(query, schema, fmt)
+    return _gzipped(chunks) if gzip else chunks
+
+
+def export_headers(name: str, fmt: str, gzip: bool) -> dict:
+    extension = "ndjson" if fmt == "ndjson" else "csv"
+    filename = f"{name}-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.{extension}"
+    if gzip:
+        filename += ".gz"
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
@@ -0,0 +1,179 @@
+import hashlib
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.sqlite import insert
+
+from app.core.cache import MISSING, idempotency_cache
+from app.core.config import IDEMPOTENCY_LOCK_SECONDS, IDEMPOTENCY_TTL_SECONDS
+from app.db.session import async_session_maker
+from app.models.idempotency_key import IdempotencyKey
+from app.utils.keyed_lock import KeyedLock
+from app.utils.timestamps import utcnow
+
+# Serializes requests carrying the same key within this process, so a
+# double click waits for the first response instead of getting a 409
+idempotency_locks = KeyedLock()
+
+
+class KeyedRequest:
+    """
+    One request under an Idempotency-Key. `replay` holds the stored
+    response when the key was seen before; otherwise the handler runs and
+    hands its response to save(). Without a key every method is a no-op.
+    """
+
+    def __init__(self, user_id: str, endpoint: str, key: Optional[str], fingerprint: str):
+        self.user_id = user_id
+        self.endpoint = endpoint
+        self.key = key
+        self.fingerprint = fingerprint
+        self.replay: Optional[dict] = None
+        self.saved = False
+
+    @property
+    def scope(self) -> tuple[str, str, str]:
+        return self.user_id, self.endpoint, self.key
+
+    @property
+    def stripe_key(self) -> Optional[str]:
+        """Key forwarded to Stripe, so its own replay covers the same request"""
+        if self.key is None:
+            return None
+        return hashlib.sha256(":".join(self.scope).encode()).hexdigest()
+
+    async def save(self, response: BaseModel):
+        if self.key is None:
+            return
+        data = response.model_dump(mode="json")
+        async with async_session_maker() as session:
+            await session.execute(
+                update(IdempotencyKey)
+                .where(
+                    IdempotencyKey.user_id == self.user_id,
+                    IdempotencyKey.endpoint == self.endpoint,
+                    IdempotencyKey.key == self.key,
+                )
+                .values(status_code=200, response=data)
+            )
+            await session.commit()
+        idempotency_cache.set(self.scope, (self.fingerprint, data))
+        self.saved = True
+
+
+def _check_fingerprint(keyed: KeyedRequest, fingerprint: str):
+    if fingerprint != keyed.fingerprint:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request",
+        )
+
+
+async def _claim(keyed: KeyedRequest) -> Optional[dict]:
+    """
+    Insert the key as "in progress". Returns the stored response when an
+    earlier request with the key completed, None when this one may run.
+    """
+    now = utcnow()
+    pk = (
+        IdempotencyKey.user_id == keyed.user_id,
+        IdempotencyKey.endpoint == keyed.endpoint,
+        IdempotencyKey.key == keyed.key,
+    )
+    async with async_session_maker() as session:
+        # Expired keys of this user go first, which also frees this one
+        await session.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.user_id == keyed.user_id, IdempotencyKey.expires_at <= now)
+        )
+        result = await session.execute(
+            insert(IdempotencyKey)
+            .values(
+                user_id=keyed.user_id,
+                endpoint=keyed.endpoint,
+                key=keyed.key,
+                fingerprint=keyed.fingerprint,
+                locked_until=now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+                expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+            )
+            .on_conflict_do_nothing()
+        )
+        if result.rowcount == 1:
+            await session.commit()
+            return None
+
+        existing = await session.get(IdempotencyKey, keyed.scope)
+        if existing is not None:
+            _check_fingerprint(keyed, existing.fingerprint)
+            if existing.response is not None:
+                idempotency_cache.set(keyed.scope, (existing.fingerprint, existing.response))
+                return existing.response
+            # Left behind by a worker that died mid-request: take it over
+            result = await session.execute(
+                update(IdempotencyKey)
+                .where(*pk, IdempotencyKey.response.is_(None), IdempotencyKey.locked_until <= now)
+                .values(locked_until=now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS))
+            )
+            if result.rowcount == 1:
+                await session.commit()
+                return None
+
+    raise HTTPException(
+        status_code=409,
+        detail="A request with this Idempotency-Key is still in progress",
+    )
+
+
+async def _release(keyed: KeyedRequest):
+    """Forget an unfinished claim so the client can retry with the same key"""
+    async with async_session_maker() as session:
+        await session.execute(
+            delete(IdempotencyKey).where(
+                IdempotencyKey.user_id == keyed.user_id,
+                IdempotencyKey.endpoint == keyed.endpoint,
+                IdempotencyKey.key == keyed.key,
+                IdempotencyKey.response.is_(None),
+            )
+        )
+        await session.commit()
+
+
+@asynccontextmanager
+async def idempotent_request(
+    user_id, endpoint: str, key: Optional[str], body: BaseModel
+) -> AsyncIterator[KeyedRequest]:
+    """
+    Run a handler at most once per (user, endpoint, Idempotency-Key).
+    Responses live in the in-process cache with the database as the
+    fallback shared by all workers. Only successful responses are stored:
+    when the handler raises, the key is released and may be retried.
+    """
+    fingerprint = hashlib.sha256(body.model_dump_json().encode()).hexdigest()
+    keyed = KeyedRequest(str(user_id), endpoint, key, fingerprint)
+    if key is None:
+        yield keyed
+        return
+
+    async with idempotency_locks(keyed.scope):
+        cached = idempotency_cache.get(keyed.scope)
+        if cached is not MISSING:
+            stored_fingerprint, keyed.replay = cached
+            _check_fingerprint(keyed, stored_fingerprint)
+        else:
+            keyed.replay = await _claim(keyed)
+
+        if keyed.replay is not None:
+            yield keyed
+            return
+
+        try:
+            yield keyed
+        finally:
+            if not keyed.saved:
+                try:
+                    await _release(keyed)
+                except Exception as e:
+                    print(f"Could not release idempotency key {keyed.key!r}: {e!r}")
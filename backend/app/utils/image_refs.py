@@ -0,0 +1,96 @@
+from collections import Counter
+from typing import Iterable
+
+from sqlalchemy import case, delete, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import async_session_maker
+from app.models.book import Book
+from app.models.image_ref import ImageRef
+from app.utils.uploads import delete_upload_files
+
+
+async def acquire_images(session: AsyncSession, image_paths: Iterable[str]):
+    """Count one more reference per entry of `image_paths` (in the caller's transaction)"""
+    counts = Counter(image_paths)
+    if not counts:
+        return
+    stmt = insert(ImageRef)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ImageRef.path],
+        set_={"ref_count": ImageRef.ref_count + stmt.excluded.ref_count},
+    )
+    await session.execute(stmt, [{"path": path, "ref_count": n} for path, n in counts.items()])
+
+
+async def release_images(session: AsyncSession, image_paths: Iterable[str]) -> list[str]:
+    """
+    Drop one reference per entry of `image_paths`. Returns the paths that
+    are no longer referenced at all; the caller deletes those files after
+    committing. Paths without a row (stored before reference counting
+    existed) are left for the garbage-collection sweep.
+    """
+    counts = Counter(image_paths)
+    if not counts:
+        return []
+
+    # Decremented in SQL so concurrent releases of the same path never
+    # overwrite each other's counts
+    result = await session.execute(
+        update(ImageRef)
+        .where(ImageRef.path.in_(counts))
+        .values(ref_count=ImageRef.ref_count - case(counts, value=ImageRef.path))
+        .returning(ImageRef.path, ImageRef.ref_count)
+        .execution_options(synchronize_session=False)
+    )
+    exhausted = [path for path, ref_count in result.all() if ref_count <= 0]
+    if not exhausted:
+        return []
+
+    result = await session.execute(
+        delete(ImageRef)
+        .where(ImageRef.path.in_(exhausted), ImageRef.ref_count <= 0)
+        .returning(ImageRef.path)
+        .execution_options(synchronize_session=False)
+    )
+    return list(result.scalars())
+
+
+async def delete_released_files(image_paths: Iterable[str]):
+    """
+    Delete the files of paths `release_images` returned, after the caller
+    committed. Each path is checked again under the database write lock
+    (which acquire_images needs too), so a path an upload has reused and
+    referenced since then keeps its file; files written too recently to
+    tell are left for the garbage-collection sweep.
+    """
+    image_paths = set(image_paths)
+    if not image_paths:
+        return
+    async with async_session_maker() as session:
+        # Writing first takes the lock before the check, not after it
+        await session.execute(
+            delete(ImageRef)
+            .where(ImageRef.path.in_(image_paths), ImageRef.ref_count <= 0)
+            .execution_options(synchronize_session=False)
+        )
+        referenced = await session.scalars(select(ImageRef.path).where(ImageRef.path.in_(image_paths)))
+        await delete_upload_files(image_paths - set(referenced), keep_recent=True)
+        await session.commit()
+
+
+async def rebuild_image_refs(session: AsyncSession) -> int:
+    """Recount every reference from books.images, the source of truth"""
+    counts: Counter = Counter()
+    result = await session.stream(select(Book.images).execution_options(yield_per=500))
+    async for (images,) in result:
+        counts.update(images or [])
+
+    await session.execute(delete(ImageRef))
+    if counts:
+        await session.execute(
+            insert(ImageRef),
+            [{"path": path, "ref_count": n} for path, n in counts.items()],
+        )
+    return len(counts)
@@ -0,0 +1,120 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+
+from app.core.cache import invalidate_books
+from app.core.config import IMAGE_WORKERS
+from app.db.session import async_session_maker
+from app.models.book import Book
+from app.utils.uploads import DERIVED_DIR, DERIVED_URL_PREFIX
+
+THUMBNAIL_SIZE = (240, 360)
+VARIANT_WIDTHS = (320, 640, 1280)
+WEBP_QUALITY = 80
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_image_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _executor
+
+
+def shutdown_image_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def generate_derivatives(image_path: str) -> dict:
+    """
+    Write a fixed-size thumbnail and WebP variants for one stored image.
+    Runs inside a worker process, so it only deals with plain data.
+    """
+    from PIL import Image, ImageOps
+
+    source = Path(f".{image_path}")
+    DERIVED_DIR.mkdir(parents=True, exist_ok=True)
+
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        width, height = image.size
+
+        def save(derived: Image.Image, suffix: str, kind: str) -> dict:
+            filename = f"{source.stem}-{suffix}.webp"
+            derived.save(DERIVED_DIR / filename, "WEBP", quality=WEBP_QUALITY, method=4)
+            return {
+                "kind": kind,
+                "url": f"{DERIVED_URL_PREFIX}/{filename}",
+                "width": derived.width,
+                "height": derived.height,
+                "format": "webp",
+            }
+
+        variants = [save(ImageOps.fit(image, THUMBNAIL_SIZE), "thumb", "thumbnail")]
+        # Never upscale; the full-size WebP covers anything wider
+        for target_width in VARIANT_WIDTHS:
+            if target_width < width:
+                target_height = round(height * target_width / width)
+                resized = image.resize((target_width, target_height), Image.Resampling.LANCZOS)
+                variants.append(save(resized, f"{target_width}w", "responsive"))
+        variants.append(save(image, f"{width}w", "responsive"))
+
+    srcset = ", ".join(
+        f"{variant['url']} {variant['width']}w" for variant in variants if variant["kind"] == "responsive"
+    )
+    return {
+        "src": image_path,
+        "width": width,
+        "height": height,
+        "srcset": srcset,
+        "variants": variants,
+    }
+
+
+async def build_image_variants(image_paths: Iterable[str]) -> list[dict]:
+    """Generate derivatives for several images in the process pool"""
+    loop = asyncio.get_running_loop()
+    executor = get_image_executor()
+    results = await asyncio.gather(
+        *(loop.run_in_executor(executor, generate_derivatives, path) for path in image_paths),
+        return_exceptions=True,
+    )
+    built = []
+    for result in results:
+        if isinstance(result, BaseException):
+            print(f"Image variant generation failed: {result!r}")
+        else:
+            built.append(result)
+    return built
+
+
+async def refresh_book_image_variants(book_id: int, image_paths: list[str]):
+    """
+    Background task run after a book's images change: build the missing
+    derivatives and record them on the book, in `images` order.
+    """
+    built = await build_image_variants(image_paths)
+    if not built:
+        return
+
+    async with async_session_maker() as session:
+        result = await session.execute(select(Book).where(Book.id == book_id))
+        book = result.scalar_one_or_none()
+        if not book:
+            return
+
+        by_src = {entry["src"]: entry for entry in book.image_variants or []}
+        by_src.update({entry["src"]: entry for entry in built})
+        # Skip images that were replaced while we were working
+        book.image_variants = [by_src[src] for src in book.images if src in by_src]
+        await session.commit()
+    invalidate_books(book_id)
@@ -0,0 +1,25 @@
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Hashable
+
+
+class KeyedLock:
+    """One asyncio.Lock per key, dropped again once nobody holds or waits for it"""
+
+    def __init__(self):
+        self._locks: dict[Hashable, asyncio.Lock] = {}
+        self._users: defaultdict[Hashable, int] = defaultdict(int)
+
+    @asynccontextmanager
+    async def __call__(self, key: Hashable):
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._users[key] += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._locks[key]
@@ -0,0 +1,64 @@
+import asyncio
+from collections import defaultdict
+
+from fastapi import HTTPException
+
+from app.core.config import ORDER_EVENTS_MAX_SUBSCRIBERS
+
+# Events buffered per subscriber; when a slow client falls behind the
+# oldest is dropped, which is safe because each event carries the full status
+SUBSCRIBER_QUEUE_SIZE = 4
+
+
+class OrderEventBroker:
+    """
+    In-process pub/sub of order status changes, keyed by order id. Only
+    reaches subscribers in the same worker, so readers should still look
+    at the database now and then.
+    """
+
+    def __init__(self, max_subscribers: int = ORDER_EVENTS_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._subscribers: defaultdict[int, set[asyncio.Queue]] = defaultdict(set)
+        self._count = 0
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, order_id: int) -> asyncio.Queue:
+        """New queue receiving the events of `order_id`. 503 when full"""
+        if self._count >= self.max_subscribers:
+            raise HTTPException(status_code=503, detail="Too many open order event streams")
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[order_id].add(queue)
+        self._count += 1
+        return queue
+
+    def unsubscribe(self, order_id: int, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(order_id)
+        if subscribers is None or queue not in subscribers:
+            return
+        subscribers.discard(queue)
+        self._count -= 1
+        if not subscribers:
+            del self._subscribers[order_id]
+
+    def publish(self, order_id: int, event: dict):
+        """Hand `event` to everyone watching `order_id`; never blocks"""
+        self.published += 1
+        for queue in self._subscribers.get(order_id, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self._count,
+            "max_subscribers": self.max_subscribers,
+            "orders_watched": len(self._subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+order_events = OrderEventBroker()
@@ -0,0 +1,55 @@
+import base64
+import json
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(values: list[Any]) -> str:
+    """Encode the sort key of the last row of a page into an opaque cursor"""
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _matches(value: Any, column) -> bool:
+    """Whether a decoded cursor value can be compared with `column`"""
+    expected = column.type.python_type
+    if isinstance(value, bool):
+        return expected is bool
+    if expected is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+
+def decode_cursor(cursor: str, columns: list) -> list[Any]:
+    """
+    Decode a cursor produced by encode_cursor for the sort key `columns`,
+    rejecting malformed input and values of the wrong type
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if (
+        not isinstance(values, list)
+        or len(values) != len(columns)
+        or not all(_matches(value, column) for value, column in zip(values, columns))
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def keyset_after(columns: list, values: list[Any], descending: bool = False):
+    """
+    Build the WHERE clause selecting rows strictly after `values` in the
+    (columns...) ordering, e.g. (a > x) OR (a = x AND b > y).
+    """
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        step = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
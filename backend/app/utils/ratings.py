@@ -0,0 +1,75 @@
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.book import Book
+from app.models.review import Review
+
+RATING_VALUES = range(1, 6)
+
+
+def histogram_column(rating: int):
+    return getattr(Book, f"rating_{rating}_count")
+
+
+def apply_review_delta(book_id: int, rating: int, sign: int):
+    """
+    UPDATE statement adding (sign=1) or removing (sign=-1) one review of
+    `rating` stars from the book's aggregates. Runs in the caller's
+    transaction so the aggregates commit together with the review row.
+    """
+    new_count = Book.review_count + sign
+    new_sum = Book.rating_sum + sign * rating
+    return (
+        update(Book)
+        .where(Book.id == book_id)
+        .values(
+            {
+                Book.reviews_version: Book.reviews_version + 1,
+                Book.review_count: new_count,
+                Book.rating_sum: new_sum,
+                Book.rating_avg: case((new_count > 0, new_sum * 1.0 / new_count), else_=0.0),
+                histogram_column(rating): histogram_column(rating) + sign,
+            }
+        )
+    )
+
+
+async def rebuild_rating_aggregates(session: AsyncSession) -> int:
+    """
+    Recompute every book's aggregates from the reviews table in two
+    set-based statements. Returns the number of books that have reviews.
+    """
+    totals = (
+        select(
+            Review.book_id.label("book_id"),
+            func.count().label("review_count"),
+            func.sum(Review.rating).label("rating_sum"),
+            *[
+                func.sum(case((Review.rating == rating, 1), else_=0)).label(f"rating_{rating}_count")
+                for rating in RATING_VALUES
+            ],
+        )
+        .group_by(Review.book_id)
+        .subquery()
+    )
+
+    reset = {Book.review_count: 0, Book.rating_sum: 0, Book.rating_avg: 0.0}
+    reset.update({histogram_column(rating): 0 for rating in RATING_VALUES})
+    await session.execute(update(Book).values(reset))
+
+    values = {
+        Book.review_count: totals.c.review_count,
+        Book.rating_sum: totals.c.rating_sum,
+        Book.rating_avg: totals.c.rating_sum * 1.0 / totals.c.review_count,
+        Book.reviews_version: Book.reviews_version + 1,
+    }
+    values.update(
+        {histogram_column(rating): totals.c[f"rating_{rating}_count"] for rating in RATING_VALUES}
+    )
+    result = await session.execute(
+        update(Book)
+        .where(Book.id == totals.c.book_id)
+        .values(values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
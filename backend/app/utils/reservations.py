@@ -0,0 +1,116 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import invalidate_books
+from app.core.config import RESERVATION_SWEEP_SECONDS, RESERVATION_TTL_SECONDS
+from app.db.session import async_session_maker
+from app.models.book import Book
+from app.models.reservation import StockReservation
+from app.utils.timestamps import utcnow
+
+# Expired reservations released per sweeper transaction
+SWEEP_BATCH_SIZE = 500
+
+
+async def reserve_stock(
+    session: AsyncSession,
+    order_id: int,
+    items: Iterable[tuple[int, int]],
+    ttl_seconds: int = RESERVATION_TTL_SECONDS,
+) -> list[int]:
+    """
+    Hold (book_id, quantity) pairs for `order_id`. Each hold is a single
+    conditional UPDATE that only succeeds while stock - reserved covers
+    it, so concurrent checkouts cannot oversell. Raises 409 when a book is
+    short; the caller rolls back. Returns the ids of the books touched.
+    """
+    quantities = Counter()
+    for book_id, quantity in items:
+        quantities[book_id] += quantity
+
+    expires_at = utcnow() + timedelta(seconds=ttl_seconds)
+    for book_id, quantity in sorted(quantities.items()):
+        result = await session.execute(
+            update(Book)
+            .where(Book.id == book_id, Book.stock - Book.reserved >= quantity)
+            .values(reserved=Book.reserved + quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            available = await session.scalar(select(Book.stock - Book.reserved).where(Book.id == book_id))
+            raise HTTPException(
+                status_code=409,
+                detail=f"Only {max(0, available or 0)} copies of book {book_id} are available",
+            )
+        session.add(StockReservation(order_id=order_id, book_id=book_id, quantity=quantity, expires_at=expires_at))
+    return sorted(quantities)
+
+
+async def _drop_reservations(session: AsyncSession, criteria) -> list[int]:
+    """
+    Delete matching reservations and give their quantities back to
+    `reserved`, in two set-based statements. Returns the affected book ids.
+    """
+    held = (
+        select(func.sum(StockReservation.quantity))
+        .where(*criteria, StockReservation.book_id == Book.id)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        update(Book)
+        .where(Book.id.in_(select(StockReservation.book_id).where(*criteria)))
+        .values(reserved=func.max(Book.reserved - held, 0))
+        .returning(Book.id)
+        .execution_options(synchronize_session=False)
+    )
+    book_ids = list(result.scalars())
+    await session.execute(delete(StockReservation).where(*criteria))
+    return book_ids
+
+
+async def release_order_reservations(session: AsyncSession, *order_ids: int) -> list[int]:
+    """Give back everything held for `order_ids` (in the caller's transaction)"""
+    if not order_ids:
+        return []
+    return await _drop_reservations(session, [StockReservation.order_id.in_(order_ids)])
+
+
+async def release_expired_reservations(now: datetime | None = None) -> int:
+    """Release holds past their expiry, one batch per transaction. Returns how many"""
+    now = now or utcnow()
+    released = 0
+    while True:
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(StockReservation.id)
+                .where(StockReservation.expires_at <= now)
+                .order_by(StockReservation.expires_at)
+                .limit(SWEEP_BATCH_SIZE)
+            )
+            ids = list(result.scalars())
+            if not ids:
+                return released
+            held = await _drop_reservations(session, [StockReservation.id.in_(ids)])
+            await session.commit()
+        invalidate_books(*held)
+        released += len(ids)
+
+
+async def run_reservation_sweeper(interval: float = RESERVATION_SWEEP_SECONDS):
+    """Background loop started by the app lifespan"""
+    while True:
+        try:
+            released = await release_expired_reservations()
+            if released:
+                print(f"Released {released} expired stock reservations")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Reservation sweep failed: {e!r}")
+        await asyncio.sleep(interval)
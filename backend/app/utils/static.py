@@ -0,0 +1,91 @@
+import os
+import re
+from mimetypes import guess_type
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+# Content-addressed ("<sha256>.ext") and uuid-named uploads never change
+# once written, nor do derivatives named after them ("<stem>-<suffix>.webp")
+IMMUTABLE_NAME_RE = re.compile(
+    r"^(?:[0-9a-f]{64}|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})"
+    r"(?:-[a-z0-9]+)?\.[a-z0-9]+$"
+)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=300"
+
+# Precompressed siblings ("file.svg.br", "file.svg.gz"), best first
+PRECOMPRESSED = [("br", ".br"), ("gzip", ".gz")]
+
+
+def accepted_encodings(request_headers: Headers) -> set[str]:
+    accepted = set()
+    for item in request_headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class UploadStaticFiles(StaticFiles):
+    """
+    StaticFiles for /uploads with long-lived caching of immutable files,
+    strong ETags and precompressed variants. Byte ranges and zero-copy
+    sends (the ASGI `http.response.pathsend` extension, when the server
+    offers it) come from Starlette's FileResponse.
+    """
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = os.fspath(full_path)
+        name = os.path.basename(full_path)
+        media_type = guess_type(name)[0] or "application/octet-stream"
+        headers = {}
+
+        served_path, served_stat, encoding = full_path, stat_result, None
+        accepted = accepted_encodings(request_headers)
+        for coding, suffix in PRECOMPRESSED:
+            try:
+                candidate_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            # The representation depends on Accept-Encoding once a sibling exists
+            headers["vary"] = "Accept-Encoding"
+            if coding in accepted:
+                served_path, served_stat, encoding = full_path + suffix, candidate_stat, coding
+                headers["content-encoding"] = coding
+                break
+
+        if IMMUTABLE_NAME_RE.match(name):
+            headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+            # Content-addressed names already are a strong validator
+            tag = name if encoding is None else f"{name}-{encoding}"
+            headers["etag"] = f'"{tag}"'
+        else:
+            headers["cache-control"] = DEFAULT_CACHE_CONTROL
+
+        response = FileResponse(
+            served_path,
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            stat_result=served_stat,
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,6 @@
+from datetime import datetime, timezone
+
+
+def utcnow() -> datetime:
+    """Current UTC time, naive, as SQLite's DateTime columns store it"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
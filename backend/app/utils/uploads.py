@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Iterable, Optional
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES
+
+UPLOAD_DIR = Path("uploads/books")
+UPLOAD_URL_PREFIX = "/uploads/books"
+# Thumbnails and WebP variants, named "<original stem>-<suffix>.webp"
+DERIVED_DIR = UPLOAD_DIR / "derived"
+DERIVED_URL_PREFIX = f"{UPLOAD_URL_PREFIX}/derived"
+# In-progress uploads, renamed to "<sha256><ext>" once fully written
+TEMP_PREFIX = ".upload-"
+# Files written this recently may belong to an upload whose reference is
+# not committed yet; released ones are left for app.jobs.gc_uploads
+REUSE_GRACE_SECONDS = 15 * 60
+
+_EXTENSION_RE = re.compile(r"\.[a-z0-9]{1,8}")
+# The suffixes generate_derivatives writes after "<original stem>"
+_DERIVED_SUFFIX_RE = re.compile(r"-(?:thumb|[0-9]+w)\.webp")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def _store_stream(source: BinaryIO, extension: str, max_bytes: int) -> str:
+    """
+    Copy `source` into the content-addressed store, hashing it on the way.
+    Returns the filename. Identical content already stored is replaced
+    all the same: a file released and deleted meanwhile comes back, and
+    the fresh mtime keeps it from being deleted before the new reference
+    is committed. Gives up past `max_bytes`.
+    """
+    digest = hashlib.sha256()
+    written = 0
+    temporary = UPLOAD_DIR / f"{TEMP_PREFIX}{uuid.uuid4().hex}.part"
+    try:
+        with open(temporary, "wb") as buffer:
+            while chunk := source.read(UPLOAD_CHUNK_BYTES):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                buffer.write(chunk)
+
+        filename = f"{digest.hexdigest()}{extension}"
+        destination = UPLOAD_DIR / filename
+        os.replace(temporary, destination)
+        return filename
+    except BaseException:
+        temporary.unlink(missing_ok=True)
+        raise
+
+
+def _normalize_extension(filename: Optional[str]) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    return extension if _EXTENSION_RE.fullmatch(extension) else ""
+
+
+async def _save_upload(upload: UploadFile, max_bytes: int) -> str:
+    if upload.size is not None and upload.size > max_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image {upload.filename} exceeds the {max_bytes} byte limit",
+        )
+
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        filename = await run_in_threadpool(
+            _store_stream, upload.file, _normalize_extension(upload.filename), max_bytes
+        )
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image {upload.filename} exceeds the {max_bytes} byte limit",
+        )
+    return f"{UPLOAD_URL_PREFIX}/{filename}"
+
+
+async def save_upload(upload: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> str:
+    """
+    Stream one uploaded image to disk on a worker thread and return its
+    public path, named after the SHA-256 of its content so identical
+    uploads share one file. Partially written files are removed on failure.
+    """
+    return await _save_upload(upload, max_bytes)
+
+
+async def save_uploads(uploads: Iterable[UploadFile], max_bytes: int = MAX_UPLOAD_BYTES) -> list[str]:
+    """
+    Save several uploads concurrently. If any of them fails, the files
+    already saved are left for app.jobs.gc_uploads: a concurrent identical
+    upload may have taken a reference to them in the meantime.
+    """
+    results = await asyncio.gather(
+        *(_save_upload(upload, max_bytes) for upload in uploads),
+        return_exceptions=True,
+    )
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        raise errors[0]
+    return results
+
+
+def _unlink_all(image_paths: list[str], modified_before: Optional[float] = None):
+    for image_path in image_paths:
+        original = Path(f".{image_path}")
+        try:
+            if modified_before is not None and original.stat().st_mtime >= modified_before:
+                continue
+        except FileNotFoundError:
+            pass
+        original.unlink(missing_ok=True)
+        for derived in DERIVED_DIR.glob(f"{original.stem}-*"):
+            # "<stem>-*" also matches the variants of "<stem>-<more>.jpg"
+            if _DERIVED_SUFFIX_RE.fullmatch(derived.name[len(original.stem):]):
+                derived.unlink(missing_ok=True)
+
+
+async def delete_upload_files(image_paths: Iterable[str], keep_recent: bool = False):
+    """
+    Remove stored images by their public path, off the event loop. With
+    `keep_recent`, files written within REUSE_GRACE_SECONDS stay.
+    """
+    image_paths = list(image_paths)
+    if image_paths:
+        modified_before = time.time() - REUSE_GRACE_SECONDS if keep_recent else None
+        await run_in_threadpool(_unlink_all, image_paths, modified_before)
@@ -0,0 +1,193 @@
+import asyncio
+from collections import deque
+from datetime import timedelta
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import WEBHOOK_MAX_ATTEMPTS, WEBHOOK_POLL_SECONDS, WEBHOOK_WORKERS
+from app.db.session import async_session_maker
+from app.models.webhook_event import WebhookEvent
+from app.utils.timestamps import utcnow
+
+EventHandler = Callable[[dict], Awaitable[None]]
+
+# Retry delays grow as base * 2**attempts, up to the cap
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 15 * 60
+# Recent receive-to-processed lags kept for the metrics endpoint
+LAG_SAMPLES = 500
+
+
+async def store_event(session: AsyncSession, event: dict) -> bool:
+    """
+    Write a verified Stripe event to the inbox (in the caller's
+    transaction). Returns False when the event id is already there.
+    """
+    now = utcnow()
+    result = await session.execute(
+        insert(WebhookEvent)
+        .values(
+            id=event["id"],
+            type=event["type"],
+            payload=event,
+            status="pending",
+            attempts=0,
+            received_at=now,
+            next_attempt_at=now,
+        )
+        .on_conflict_do_nothing(index_elements=[WebhookEvent.id])
+    )
+    return result.rowcount == 1
+
+
+class WebhookInbox:
+    """
+    Pool of asyncio workers draining `webhook_events` in arrival order.
+    Failed events are retried with backoff and parked as "failed" after
+    WEBHOOK_MAX_ATTEMPTS. The handler is responsible for serializing work
+    on the same order.
+    """
+
+    def __init__(self, workers: int = WEBHOOK_WORKERS, poll_interval: float = WEBHOOK_POLL_SECONDS):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.handler: Optional[EventHandler] = None
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._in_flight: set[str] = set()
+        self._lags: deque[float] = deque(maxlen=LAG_SAMPLES)
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+
+    def start(self, handler: EventHandler):
+        self.handler = handler
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake the workers after a new event was committed"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _claim(self) -> Optional[str]:
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(WebhookEvent.id)
+                .where(WebhookEvent.status == "pending", WebhookEvent.next_attempt_at <= utcnow())
+                .order_by(WebhookEvent.next_attempt_at, WebhookEvent.received_at)
+                .limit(self.workers + 1)
+            )
+            for event_id in result.scalars():
+                if event_id not in self._in_flight:
+                    self._in_flight.add(event_id)
+                    return event_id
+        return None
+
+    async def _worker(self):
+        while True:
+            # Cleared before looking, so a notify() during the query is not lost
+            self._wakeup.clear()
+            try:
+                event_id = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Webhook inbox claim failed: {e!r}")
+                event_id = None
+
+            if event_id is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._process(event_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Loading the event or saving its outcome failed (e.g. the
+                # database is locked); it stays pending for a later attempt
+                print(f"Webhook event {event_id} could not be processed: {e!r}")
+                await asyncio.sleep(self.poll_interval)
+            finally:
+                self._in_flight.discard(event_id)
+
+    async def _process(self, event_id: str):
+        async with async_session_maker() as session:
+            event = await session.get(WebhookEvent, event_id)
+            if event is None or event.status != "pending":
+                return
+            payload, received_at, attempts = event.payload, event.received_at, event.attempts
+
+        try:
+            await self.handler(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            attempts += 1
+            give_up = attempts >= WEBHOOK_MAX_ATTEMPTS
+            delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempts)
+            values = {
+                "attempts": attempts,
+                "last_error": repr(e)[:1000],
+                "status": "failed" if give_up else "pending",
+                "next_attempt_at": utcnow() + timedelta(seconds=delay),
+            }
+            print(f"Webhook event {event_id} failed (attempt {attempts}): {e!r}")
+        else:
+            now = utcnow()
+            values = {"attempts": attempts + 1, "status": "processed", "processed_at": now, "last_error": None}
+
+        async with async_session_maker() as session:
+            await session.execute(update(WebhookEvent).where(WebhookEvent.id == event_id).values(**values))
+            await session.commit()
+
+        # Counted once the outcome is stored
+        if values["status"] == "processed":
+            self.processed += 1
+            self._lags.append((values["processed_at"] - received_at).total_seconds())
+        elif values["status"] == "failed":
+            self.failed += 1
+        else:
+            self.retried += 1
+
+    async def stats(self) -> dict:
+        """Queue depth and processing lag for /metrics/webhooks"""
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(WebhookEvent.status, func.count(), func.min(WebhookEvent.received_at))
+                .group_by(WebhookEvent.status)
+            )
+            by_status = {status: (count, oldest) for status, count, oldest in result.all()}
+
+        pending, oldest_pending = by_status.get("pending", (0, None))
+        lags = sorted(self._lags)
+        return {
+            "workers": len(self._tasks),
+            "queue_depth": pending,
+            "in_flight": len(self._in_flight),
+            "oldest_pending_age_seconds": (
+                round((utcnow() - oldest_pending).total_seconds(), 3) if oldest_pending else 0.0
+            ),
+            "failed_total": by_status.get("failed", (0, None))[0],
+            "processed_since_start": self.processed,
+            "retried_since_start": self.retried,
+            "failed_since_start": self.failed,
+            "lag_p50_seconds": round(lags[len(lags) // 2], 3) if lags else None,
+            "lag_p95_seconds": round(lags[int(len(lags) * 0.95)], 3) if lags else None,
+        }
+
+
+webhook_inbox = WebhookInbox()
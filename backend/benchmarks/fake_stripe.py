@@ -0,0 +1,161 @@
+"""
+Minimal local stand-in for the parts of the Stripe API the backend uses.
+
+    python benchmarks/fake_stripe.py --port 12111 --latency-ms 150
+
+then run the backend with STRIPE_API_BASE=http://127.0.0.1:12111 and any
+STRIPE_SECRET_KEY. Responses are canned but shaped like Stripe's; every
+request waits --latency-ms and --failure-rate of them answer 500, so the
+gateway's retries and circuit breaker can be exercised offline.
+Idempotency-Key is honoured like Stripe does. POST /_seed with
+{"objects": [...]} preloads sessions or payment intents in a given state,
+e.g. for reconciling many old orders.
+"""
+import argparse
+import asyncio
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+def create_app(latency: float = 0.15, failure_rate: float = 0.0) -> Starlette:
+    objects: dict[str, dict] = {}
+    # Seeded objects keep the state they were given
+    seeded: set[str] = set()
+    idempotent_responses: dict[str, dict] = {}
+    stats = {"requests": 0, "failures": 0}
+
+    async def simulate() -> JSONResponse | None:
+        stats["requests"] += 1
+        await asyncio.sleep(latency)
+        if random.random() < failure_rate:
+            stats["failures"] += 1
+            return JSONResponse(
+                {"error": {"type": "api_error", "message": "Simulated outage"}},
+                status_code=500,
+            )
+        return None
+
+    async def create(request: Request, kind: str, prefix: str, extra: dict) -> JSONResponse:
+        if failure := await simulate():
+            return failure
+        key = request.headers.get("idempotency-key")
+        if key and key in idempotent_responses:
+            return JSONResponse(idempotent_responses[key])
+
+        form = await request.form()
+        object_id = f"{prefix}_test_{uuid.uuid4().hex[:24]}"
+        body = {
+            "id": object_id,
+            "object": kind,
+            "created": int(time.time()),
+            "livemode": False,
+            "metadata": {
+                k[len("metadata["):-1]: v for k, v in form.items() if k.startswith("metadata[")
+            },
+            **extra,
+        }
+        if "amount" in form:
+            body["amount"] = int(form["amount"])
+            body["currency"] = form.get("currency", "usd")
+        objects[object_id] = body
+        if key:
+            idempotent_responses[key] = body
+        return JSONResponse(body)
+
+    async def create_checkout_session(request: Request):
+        return await create(request, "checkout.session", "cs", {
+            "payment_status": "unpaid",
+            "status": "open",
+            "url": "http://127.0.0.1/fake-checkout",
+        })
+
+    async def create_payment_intent(request: Request):
+        return await create(request, "payment_intent", "pi", {
+            "status": "requires_payment_method",
+            "client_secret": f"secret_{uuid.uuid4().hex}",
+        })
+
+    async def retrieve(request: Request):
+        if failure := await simulate():
+            return failure
+        body = objects.get(request.path_params["object_id"])
+        if body is None:
+            return JSONResponse(
+                {"error": {"type": "invalid_request_error", "message": "No such object"}},
+                status_code=404,
+            )
+        if body["object"] == "checkout.session" and body["id"] not in seeded:
+            # Pretend the customer paid as soon as anyone looks
+            body.update(payment_status="paid", status="complete")
+        return JSONResponse(body)
+
+    async def get_stats(request: Request):
+        return JSONResponse(stats)
+
+    async def seed(request: Request):
+        payload = await request.json()
+        for body in payload["objects"]:
+            objects[body["id"]] = body
+            seeded.add(body["id"])
+        return JSONResponse({"seeded": len(payload["objects"])})
+
+    return Starlette(routes=[
+        Route("/v1/checkout/sessions", create_checkout_session, methods=["POST"]),
+        Route("/v1/checkout/sessions/{object_id}", retrieve, methods=["GET"]),
+        Route("/v1/payment_intents", create_payment_intent, methods=["POST"]),
+        Route("/v1/payment_intents/{object_id}", retrieve, methods=["GET"]),
+        Route("/_stats", get_stats, methods=["GET"]),
+        Route("/_seed", seed, methods=["POST"]),
+    ])
+
+
+def start_server(port: int, latency: float = 0.15, failure_rate: float = 0.0) -> subprocess.Popen:
+    """
+    Run the fake on 127.0.0.1:`port` in its own process (so it does not
+    compete with the client for the GIL) and wait until it accepts
+    connections. The caller terminates the returned process.
+    """
+    process = subprocess.Popen([
+        sys.executable, __file__,
+        "--port", str(port),
+        "--latency-ms", str(latency * 1000),
+        "--failure-rate", str(failure_rate),
+    ])
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError(f"Fake Stripe did not start on port {port}")
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.latency_ms / 1000, args.failure_rate),
+        host="127.0.0.1",
+        port=args.port,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Compare the old per-item ORM loop in process_successful_payment with the
+set-based version, on a throwaway database.
+
+    python benchmarks/payment_completion.py --lines 200 --rounds 5 --orders 50
+
+Two scenarios:
+
+* one order whose cart has --lines distinct books, completed --rounds
+  times: wall time per completion;
+* --orders orders whose carts all hold one copy of the same --books
+  books, completed concurrently: wall time, failed completions and lost
+  updates (copies sold but not taken off stock). SQLite serializes
+  writers, so the loop only loses updates here when pointed at a
+  database with row-level concurrency via DATABASE_URL.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+async def legacy_process_successful_payment(order, session):
+    """process_successful_payment before the set-based rewrite (cleanup elided)"""
+    from sqlalchemy import select, update
+    from sqlalchemy.orm import selectinload
+    from app.models.cart import Cart
+    from app.models.cart_items import CartItem
+    from app.models.orders import Order
+
+    claimed = await session.execute(
+        update(Order)
+        .where(Order.id == order.id, Order.status != "completed")
+        .values(status="completed")
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount != 1:
+        await session.rollback()
+        return False
+
+    cart_result = await session.execute(
+        select(Cart).where(Cart.id == order.cart_id).options(selectinload(Cart.items).selectinload(CartItem.book))
+    )
+    cart = cart_result.scalar_one_or_none()
+    if cart and cart.items:
+        for item in cart.items:
+            if item.book:
+                new_stock = max(0, item.book.stock - item.quantity)
+                item.book.stock = new_stock
+                if new_stock == 0:
+                    await session.delete(item.book)
+                else:
+                    session.add(item.book)
+        for item in list(cart.items):
+            await session.delete(item)
+    await session.commit()
+    return True
+
+
+async def seed(session, book_count: int, stock: int) -> list[int]:
+    from app.models.book import Book
+
+    books = [Book(title=f"Bench {i}", description="bench", stock=stock, price=10.0) for i in range(book_count)]
+    session.add_all(books)
+    await session.flush()
+    return [book.id for book in books]
+
+
+async def new_order(session, book_ids: list[int]) -> int:
+    from app.models.cart import Cart
+    from app.models.cart_items import CartItem
+    from app.models.orders import Order
+    from app.models.user import User
+
+    user = User(email=f"{uuid.uuid4().hex}@bench.local", hashed_password="x")
+    session.add(user)
+    await session.flush()
+    cart = Cart(user_id=user.id)
+    session.add(cart)
+    await session.flush()
+    session.add_all(CartItem(cart_id=cart.id, book_id=book_id, quantity=1) for book_id in book_ids)
+    order = Order(user_id=user.id, cart_id=cart.id, total_amount=10.0 * len(book_ids), status="pending")
+    session.add(order)
+    await session.flush()
+    return order.id
+
+
+async def complete(process, order_id: int) -> bool:
+    from app.db.session import async_session_maker
+    from app.models.orders import Order
+
+    async with async_session_maker() as session:
+        order = await session.get(Order, order_id)
+        return await process(order, session)
+
+
+async def large_cart(process, args) -> float:
+    from app.db.session import async_session_maker
+
+    elapsed = 0.0
+    for _ in range(args.rounds):
+        async with async_session_maker() as session:
+            book_ids = await seed(session, args.lines, stock=1000)
+            order_id = await new_order(session, book_ids)
+            await session.commit()
+        started = time.perf_counter()
+        await complete(process, order_id)
+        elapsed += time.perf_counter() - started
+    return elapsed / args.rounds
+
+
+async def contention(process, args) -> tuple[float, int, int]:
+    from sqlalchemy import func, select
+    from app.db.session import async_session_maker
+    from app.models.book import Book
+
+    stock = args.orders + 1
+    async with async_session_maker() as session:
+        book_ids = await seed(session, args.books, stock=stock)
+        order_ids = [await new_order(session, book_ids) for _ in range(args.orders)]
+        await session.commit()
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(complete(process, order_id) for order_id in order_ids), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for result in results if result is not True)
+    completed = args.orders - failed
+
+    async with async_session_maker() as session:
+        remaining = await session.scalar(select(func.sum(Book.stock)).where(Book.id.in_(book_ids)))
+    lost_updates = (remaining or 0) - (stock - completed) * args.books
+    return elapsed, failed, lost_updates
+
+
+async def run(args):
+    from app.main import app
+    from app.api.payment import process_successful_payment
+
+    async with app.router.lifespan_context(app):
+        for name, process in (
+            ("ORM loop (before)", legacy_process_successful_payment),
+            ("set-based (after)", process_successful_payment),
+        ):
+            per_order = await large_cart(process, args)
+            elapsed, failed, lost = await contention(process, args)
+            print(
+                f"{name:20s} {args.lines}-line cart {per_order * 1000:8.1f} ms   "
+                f"{args.orders} concurrent orders {elapsed:6.2f}s, {failed} failed, {lost} lost updates"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=200, help="distinct books in the large cart")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--orders", type=int, default=50, help="orders completed concurrently")
+    parser.add_argument("--books", type=int, default=5, help="books shared by the concurrent orders")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    # The app resolves its database and uploads directory from the cwd
+    os.chdir(tempfile.mkdtemp(prefix="bookly-bench-"))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Run the pending-order reconciliation job offline against the fake Stripe
+server, on a throwaway database seeded with many stuck orders.
+
+    python benchmarks/reconcile_orders.py --orders 100000 --concurrency 20 --latency-ms 50
+
+The orders are a mix of paid and expired checkout sessions, succeeded and
+canceled payment intents, sessions still open long after checkout and
+orders that never reached Stripe. Reports the wall time, orders per
+second and what the job did with them. Use --concurrency 1 with a small
+--orders for the one-lookup-at-a-time baseline.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR / "benchmarks"))
+
+from fake_stripe import start_server  # noqa: E402
+
+SEED_CHUNK = 10_000
+
+# (share of orders, Stripe object or None, state)
+SCENARIOS = [
+    (0.60, "checkout.session", "paid"),
+    (0.15, "checkout.session", "expired"),
+    (0.10, "payment_intent", "succeeded"),
+    (0.05, "payment_intent", "canceled"),
+    (0.05, "checkout.session", "open"),
+    (0.05, None, None),
+]
+
+
+def stripe_object(kind: str, state: str) -> dict:
+    if kind == "checkout.session":
+        return {
+            "id": f"cs_test_{uuid.uuid4().hex}",
+            "object": kind,
+            "status": "complete" if state == "paid" else state,
+            "payment_status": "paid" if state == "paid" else "unpaid",
+        }
+    return {"id": f"pi_test_{uuid.uuid4().hex}", "object": kind, "status": state}
+
+
+async def seed(args, base: str):
+    import httpx
+    from sqlalchemy import insert, literal, select
+    from app.db.base import Base
+    from app.db.session import async_session_maker, engine
+    from app.models.book import Book
+    from app.models.cart import Cart
+    from app.models.order_items import OrderItem
+    from app.models.orders import Order
+    from app.models.user import User
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    created_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=3)
+    async with async_session_maker() as session, httpx.AsyncClient(base_url=base, timeout=60) as client:
+        user = User(email="bench@bookly.local", hashed_password="x")
+        session.add(user)
+        await session.flush()
+        cart = Cart(user_id=user.id)
+        book = Book(title="Bench", description="-", price=10.0, stock=10 * args.orders)
+        session.add_all([cart, book])
+        await session.flush()
+
+        rows, objects = [], []
+        for share, kind, state in SCENARIOS:
+            for _ in range(int(args.orders * share)):
+                row = {"user_id": user.id, "cart_id": cart.id, "total_amount": 10.0, "status": "pending", "created_at": created_at}
+                if kind is not None:
+                    body = stripe_object(kind, state)
+                    objects.append(body)
+                    key = "stripe_session_id" if kind == "checkout.session" else "stripe_payment_intent_id"
+                    row[key] = body["id"]
+                rows.append(row)
+
+        for start in range(0, len(rows), SEED_CHUNK):
+            await session.execute(insert(Order), rows[start:start + SEED_CHUNK])
+        # One line per order, as checkout records them
+        await session.execute(
+            insert(OrderItem).from_select(
+                ["order_id", "book_id", "title", "unit_price", "quantity"],
+                select(Order.id, literal(book.id), literal(book.title), literal(book.price), literal(1)),
+            )
+        )
+        await session.commit()
+        for start in range(0, len(objects), SEED_CHUNK):
+            response = await client.post("/_seed", json={"objects": objects[start:start + SEED_CHUNK]})
+            response.raise_for_status()
+    return len(rows)
+
+
+async def run(args, base: str):
+    import httpx
+    from app.db.session import engine
+    from app.jobs.reconcile_orders import reconcile
+
+    seeded = await seed(args, base)
+    started = time.perf_counter()
+    counts = await reconcile(batch_size=args.batch_size, concurrency=args.concurrency)
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    async with httpx.AsyncClient(base_url=base) as client:
+        stripe_requests = (await client.get("/_stats")).json()["requests"]
+    print(f"{seeded} pending orders, concurrency {args.concurrency}, batch {args.batch_size}")
+    print(f"wall time {elapsed:.1f}s, {seeded / elapsed:.0f} orders/s, {stripe_requests} Stripe requests")
+    print(dict(counts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--port", type=int, default=12112)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    base = f"http://127.0.0.1:{args.port}"
+    os.environ["STRIPE_API_BASE"] = base
+    os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_fake")
+    # The app resolves its database from the cwd
+    os.chdir(tempfile.mkdtemp(prefix="bookly-bench-"))
+    server = start_server(args.port, latency=args.latency_ms / 1000)
+    try:
+        asyncio.run(run(args, base))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Compare ways of turning BookRead / CartRead payloads into JSON bytes.
+
+    python benchmarks/serialization.py --books 50 --rounds 2000
+
+"encoder" is the classic path (jsonable_encoder + json.dumps, still used
+for routes without a response model), "orjson" is what ORJSONResponse does
+(dump to JSON-compatible Python, then orjson) when orjson is installed, and
+"pydantic" is TypeAdapter.dump_json, which FastAPI runs for routes that
+declare a response_model and keep the default response class. The wire
+size of each payload with gzip and brotli is reported as well.
+"""
+import argparse
+import gzip
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def sample_books(n):
+    from app.schemas.book import BookRead
+
+    now = datetime.now(timezone.utc)
+    return [
+        BookRead(
+            id=i,
+            sku=f"SKU-{i:06d}",
+            title=f"Book number {i}",
+            description="A reasonably long description of the book. " * 8,
+            stock=i % 17,
+            price=9.99 + i,
+            images=[f"/uploads/books/{uuid.uuid4().hex}.jpg" for _ in range(2)],
+            image_variants=[],
+            version=3,
+            updated_at=now,
+            review_count=12,
+            rating_sum=50,
+            rating_avg=4.17,
+            rating_histogram=[0, 1, 1, 4, 6],
+        )
+        for i in range(n)
+    ]
+
+
+def sample_cart(books):
+    from app.schemas.cart import CartRead
+
+    now = datetime.now(timezone.utc)
+    return CartRead(
+        id=1,
+        user_id=uuid.uuid4(),
+        created_at=now,
+        items=[
+            {
+                "id": i,
+                "cart_id": 1,
+                "book_id": book.id,
+                "quantity": 1 + i % 3,
+                "added_at": now,
+                "book": book.model_dump(),
+            }
+            for i, book in enumerate(books)
+        ],
+    )
+
+
+def timed(fn, rounds):
+    fn()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def report(name, payload, annotation, rounds):
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+
+    adapter = TypeAdapter(annotation)
+    serializers = {
+        "encoder": lambda: json.dumps(jsonable_encoder(payload)).encode(),
+        "pydantic": lambda: adapter.dump_json(payload),
+    }
+    try:
+        import orjson
+    except ImportError:
+        pass
+    else:
+        serializers["orjson"] = lambda: orjson.dumps(adapter.dump_python(payload, mode="json"))
+
+    print(name)
+    for label, fn in serializers.items():
+        print(f"  {label:9s} {timed(fn, rounds):9.1f} us/response")
+
+    body = adapter.dump_json(payload)
+    sizes = [f"raw {len(body)}", f"gzip {len(gzip.compress(body, 6))}"]
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        sizes.append(f"br {len(brotli.compress(body, quality=4))}")
+    print(f"  bytes: {'  '.join(sizes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    from app.schemas.book import BookRead
+    from app.schemas.cart import CartRead
+
+    books = sample_books(args.books)
+    report(f"list[BookRead] x{args.books}", books, list[BookRead], args.rounds)
+    report(f"CartRead with {min(args.books, 20)} items", sample_cart(books[:20]), CartRead, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Compare the /uploads mount against Starlette's default StaticFiles.
+
+    python benchmarks/static_uploads.py --requests 2000
+
+For each implementation it reports throughput for full GETs, revalidation
+(If-None-Match) and single byte-range requests, plus how many requests a
+browser-like client that honours Cache-Control makes for repeat views.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+async def measure(client, paths, n, headers_for):
+    started = time.perf_counter()
+    for i in range(n):
+        path = paths[i % len(paths)]
+        response = await client.get(path, headers=headers_for(path))
+        assert response.status_code in (200, 206, 304), response.status_code
+    return n / (time.perf_counter() - started)
+
+
+async def repeat_views(client, paths, views):
+    """Requests sent by a client that caches per Cache-Control/ETag"""
+    cache = {}
+    sent = 0
+    for _ in range(views):
+        for path in paths:
+            entry = cache.get(path)
+            if entry and "immutable" in entry.get("cache-control", ""):
+                continue
+            headers = {"If-None-Match": entry["etag"]} if entry and "etag" in entry else {}
+            response = await client.get(path, headers=headers)
+            sent += 1
+            if response.status_code == 200:
+                cache[path] = dict(response.headers)
+    return sent
+
+
+async def bench(name, static_app, paths, args):
+    import httpx
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+
+    app = Starlette(routes=[Mount("/uploads", static_app)])
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        etags = {p: (await client.get(p)).headers["etag"] for p in paths}
+        full = await measure(client, paths, args.requests, lambda p: {})
+        conditional = await measure(client, paths, args.requests, lambda p: {"If-None-Match": etags[p]})
+        ranged = await measure(client, paths, args.requests, lambda p: {"Range": "bytes=0-1023"})
+        sent = await repeat_views(client, paths, args.views)
+        sample = await client.get(paths[0])
+
+    print(f"{name}")
+    print(f"  cache-control: {sample.headers.get('cache-control', '-')}  etag: {sample.headers['etag']}")
+    print(f"  full GET {full:8.0f} req/s   If-None-Match {conditional:8.0f} req/s   Range {ranged:8.0f} req/s")
+    print(f"  {args.views} repeat views of {len(paths)} covers -> {sent} requests")
+
+
+async def run(args):
+    from starlette.staticfiles import StaticFiles
+    from app.utils.static import UploadStaticFiles
+
+    upload_dir = Path("uploads/books")
+    upload_dir.mkdir(parents=True)
+    paths = []
+    for _ in range(args.files):
+        content = os.urandom(args.size_kb * 1024)
+        filename = f"{hashlib.sha256(content).hexdigest()}.jpg"
+        (upload_dir / filename).write_bytes(content)
+        paths.append(f"/uploads/books/{filename}")
+
+    await bench("StaticFiles (before)", StaticFiles(directory="uploads"), paths, args)
+    await bench("UploadStaticFiles (after)", UploadStaticFiles(directory="uploads"), paths, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=24)
+    parser.add_argument("--size-kb", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--views", type=int, default=10)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(tempfile.mkdtemp(prefix="bookly-bench-"))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
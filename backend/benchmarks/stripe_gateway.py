@@ -0,0 +1,101 @@
+"""
+Compare blocking Stripe SDK calls inside async handlers with the pooled
+async gateway, against the local fake Stripe server.
+
+    python benchmarks/stripe_gateway.py --calls 200 --concurrency 50 --latency-ms 150
+
+Each simulated handler creates one checkout session. Reports throughput
+and the worst event-loop stall seen by a 10 ms heartbeat task, which is
+how long every other request on the worker was frozen. Past ~20
+connections httpx's pool bookkeeping costs more than it gains, hence the
+--pool default.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR / "benchmarks"))
+
+from fake_stripe import start_server  # noqa: E402
+
+CHECKOUT_PARAMS = {
+    "payment_method_types": ["card"],
+    "mode": "payment",
+    "line_items": [{"price_data": {"currency": "usd", "product_data": {"name": "Book"}, "unit_amount": 1099}, "quantity": 1}],
+    "success_url": "http://localhost:3000/dashboard",
+    "metadata": {"cart_id": "1"},
+}
+
+
+async def heartbeat(stop: asyncio.Event, stalls: list):
+    interval = 0.01
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - started - interval)
+
+
+async def run(name, handler, args):
+    stop, stalls = asyncio.Event(), []
+    beat = asyncio.create_task(heartbeat(stop, stalls))
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one():
+        async with semaphore:
+            await handler()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.calls)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await beat
+    print(f"{name:28s} {args.calls / elapsed:8.1f} calls/s   worst loop stall {max(stalls) * 1000:8.1f} ms")
+
+
+async def main_async(args):
+    import stripe
+    from app.core.stripe import StripeGateway
+
+    base = f"http://127.0.0.1:{args.port}"
+
+    stripe.api_key = "sk_test_fake"
+    stripe.api_base = base
+
+    async def blocking_handler():
+        # What payment.py used to do: a synchronous SDK call on the loop
+        stripe.checkout.Session.create(**CHECKOUT_PARAMS)
+
+    gateway = StripeGateway("sk_test_fake", api_base=base, max_concurrency=args.pool)
+
+    async def gateway_handler():
+        await gateway.create_checkout_session(**CHECKOUT_PARAMS)
+
+    await run("blocking SDK (before)", blocking_handler, args)
+    await run("StripeGateway (after)", gateway_handler, args)
+    await gateway.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--pool", type=int, default=20, help="gateway connections (STRIPE_MAX_CONCURRENCY)")
+    parser.add_argument("--port", type=int, default=12111)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_fake")
+    server = start_server(args.port, latency=args.latency_ms / 1000)
+    try:
+        asyncio.run(main_async(args))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
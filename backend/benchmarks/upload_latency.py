@@ -0,0 +1,88 @@
+"""
+Measure GET /books latency while large image uploads are in flight.
+
+Runs the app in-process on a throwaway database and uploads directory:
+
+    python benchmarks/upload_latency.py --uploads 4 --size-mb 8
+
+Run it on a commit before the streaming upload change to compare: there
+every upload copy blocked the event loop and the p99 tracks upload time.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+async def run(args):
+    import httpx
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            login = await client.post(
+                "/auth/jwt/login",
+                data={"username": "admin@bookly.com", "password": "password123"},
+            )
+            headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+            image = os.urandom(args.size_mb * 1024 * 1024)
+
+            async def upload():
+                files = [("images", (f"cover{i}.jpg", image, "image/jpeg")) for i in range(args.images)]
+                data = {"title": "Bench", "description": "bench", "stock": "1", "price": "1"}
+                response = await client.post("/books", data=data, files=files, headers=headers)
+                response.raise_for_status()
+
+            latencies = []
+            stop = asyncio.Event()
+
+            async def poll():
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    # Bypass the read cache so every request reaches the handler
+                    response = await client.get("/books", params={"limit": 20, "q": f"b{len(latencies)}"})
+                    response.raise_for_status()
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    await asyncio.sleep(0.005)
+
+            poller = asyncio.create_task(poll())
+            await asyncio.sleep(0.2)
+            started = time.perf_counter()
+            for _ in range(args.rounds):
+                await asyncio.gather(*(upload() for _ in range(args.uploads)))
+            upload_seconds = time.perf_counter() - started
+            stop.set()
+            await poller
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"uploads: {args.rounds} x {args.uploads} concurrent, {args.images} x {args.size_mb} MiB images each")
+    print(f"upload wall time: {upload_seconds:.2f}s")
+    print(f"GET /books samples: {len(latencies)}")
+    print(f"p50 {statistics.median(latencies):.1f} ms  p99 {p99:.1f} ms  max {latencies[-1]:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=4, help="concurrent create_book requests")
+    parser.add_argument("--images", type=int, default=4, help="images per request")
+    parser.add_argument("--size-mb", type=int, default=4, help="size of each image")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ.setdefault("MAX_UPLOAD_BYTES", str((args.size_mb + 1) * 1024 * 1024))
+    sys.path.insert(0, str(BACKEND_DIR))
+    # The app resolves its database and uploads directory from the cwd
+    os.chdir(tempfile.mkdtemp(prefix="bookly-bench-"))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
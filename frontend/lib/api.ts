@@ -247,15 +247,29 @@ export const apiClient = {
   },
 
   async getBooks() {
-    const response = await fetch(`${API_BASE_URL}/books`, {
-      method: "GET",
-    });
+    // The catalog is served in pages; follow X-Next-Cursor to the last one
+    const books: any[] = [];
+    let cursor: string | null = null;
 
-    if (!response.ok) {
-      throw new Error("Failed to fetch books");
-    }
+    do {
+      const params = new URLSearchParams({ limit: "200" });
+      if (cursor) {
+        params.set("cursor", cursor);
+      }
 
-    return response.json();
+      const response: Response = await fetch(`${API_BASE_URL}/books?${params}`, {
+        method: "GET",
+      });
+
+      if (!response.ok) {
+        throw new Error("Failed to fetch books");
+      }
+
+      books.push(...(await response.json()));
+      cursor = response.headers.get("X-Next-Cursor");
+    } while (cursor);
+
+    return books;
   },
 
   async getBookById(id: number) {
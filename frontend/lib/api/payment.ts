@@ -45,22 +45,36 @@ export const paymentAPI = {
 
   // Get user orders
   async getOrders() {
-    const response = await fetchWithAuth(
-      `${API_BASE_URL}/payments/orders`,
-      {
-        method: "GET",
-      },
-      true,
-    );
+    // Orders are served in pages, newest first; follow X-Next-Cursor
+    const orders: any[] = [];
+    let cursor: string | null = null;
 
-    if (!response.ok) {
-      const error = await response.json();
-      throw new Error(
-        formatErrorMessage(error.detail) || "Failed to fetch orders",
+    do {
+      const params = new URLSearchParams({ limit: "100" });
+      if (cursor) {
+        params.set("cursor", cursor);
+      }
+
+      const response: Response = await fetchWithAuth(
+        `${API_BASE_URL}/payments/orders?${params}`,
+        {
+          method: "GET",
+        },
+        true,
       );
-    }
 
-    return response.json();
+      if (!response.ok) {
+        const error = await response.json();
+        throw new Error(
+          formatErrorMessage(error.detail) || "Failed to fetch orders",
+        );
+      }
+
+      orders.push(...(await response.json()));
+      cursor = response.headers.get("X-Next-Cursor");
+    } while (cursor);
+
+    return orders;
   },
 
   // Get specific order